@@ -1,42 +1,50 @@
 import asyncio
+import os
 from typing import List
 
 import click
-import httpx
 from tqdm import tqdm
 
 from model import constants
 from model.constants import MAX_CANDIDATES_NUM
 from model.developer import Developer
 from model.fetcher import fetch_stargazers_for_repo
+from model.ann_index import AnnIndex
+from model.batch import read_seeds, run_batch
+from model.checkpoint import Checkpoint
+from model.feature_store import FeatureStore
+from model.github_session import GitHubSession
+from model.metrics import metrics
+from model.service import serve
 from model.repository import Repository
 from model.repository_aggregator import RepositoryAggregator
+from model.similarity import SimilarityEngine
 
 
-async def get_candidates(start_developer: Developer, asyncio_client: httpx.AsyncClient = None) -> List[Developer]:
+async def get_candidates(start_developer: Developer, session: GitHubSession = None) -> List[Developer]:
     """
     Return list of developers (candidates) from stargazers of stargazed repositories
     :param start_developer: developer, from whom to start looking for candidates
-    :param asyncio_client: asyncio client to perform requests from
+    :param session: GitHub session to perform requests from
     :return: list of developer candidates: those who stargazed the start_developer's repositories
     """
-    stargazed_repos = await start_developer.get_stargazed_repos(asyncio_client)
+    if session is None:
+        github_session = GitHubSession()
+    else:
+        github_session = session
+    stargazed_repos = await start_developer.get_stargazed_repos(github_session)
     tasks = []
     candidates = set[Developer]()
-    if asyncio_client is None:
-        client = httpx.AsyncClient(timeout=None)
-    else:
-        client = asyncio_client
     for repo in tqdm(stargazed_repos, total=len(stargazed_repos),
                      desc="gathering candidates from starred repos"):
         tasks.append(
-            fetch_stargazers_for_repo(repo.url, client)
+            fetch_stargazers_for_repo(repo.url, github_session)
         )
 
     response = await asyncio.gather(*tasks)
 
-    if asyncio_client is None:
-        await client.aclose()
+    if session is None:
+        await github_session.aclose()
 
     for page_candidates in response:
         candidates.update([Developer(candidate_url) for candidate_url in page_candidates])
@@ -51,11 +59,24 @@ def compute_similarities(main_developer, developers) -> List[float]:
     :param developers: other developers
     :return: list of similarities (cosine similarity based on languages and vars)
     """
-    result = []
-    i = 0
-    for developer in tqdm(developers, desc='computing similarities between developers'):
-        result.append(asyncio.run(main_developer.compute_similarity(developer)))
-    return result
+    return SimilarityEngine(developers).scores(main_developer).tolist()
+
+
+async def crawl(aggregator: RepositoryAggregator, starting_repo_url: str, print_popular_repos: bool) -> List[Developer]:
+    """
+    Runs the crawl with one GitHub session shared by all requests
+    :param aggregator: aggregator for the starting repository
+    :param starting_repo_url: url of the starting repository
+    :param print_popular_repos: whether to print the most common repos of the stargazers
+    :return: gathered developers
+    """
+    async with GitHubSession() as session:
+        developers = await aggregator.get_developers(session)
+
+    if print_popular_repos:
+        print(f"Most common repos for stargazers of {starting_repo_url}: \n{aggregator.top_repos.most_common()}")
+
+    return developers
 
 
 @click.command()
@@ -67,33 +88,118 @@ def compute_similarities(main_developer, developers) -> List[float]:
               help='Number of top repos from stargazers of the initial to analyze.')
 @click.option('--commits_per_repo', default=5, help='Number of commits to analyze.')
 @click.option('--print_popular_repos', is_flag=True)
+@click.option('--backend', default='rest', type=click.Choice(['rest', 'graphql']),
+              help='GitHub API used to fetch stargazers and starred repos.')
+@click.option('--similar_to', default=None, help='Email of a gathered developer to rank the others against.')
+@click.option('--top_k', default=10, help='Number of similar developers to print.')
+@click.option('--index', 'index_path', default=None,
+              help='Path of the persistent nearest neighbour index to add the gathered developers to and query.')
+@click.option('--incremental', is_flag=True,
+              help='Mine only commits added since the previous run and accumulate profiles in the feature store.')
+@click.option('--metrics', 'metrics_path', default=None,
+              help='Path of the metrics report, a Prometheus text file if it ends with .prom, JSON otherwise.')
+@click.option('--profile', is_flag=True, help=f'Profile every stage with cProfile into {constants.PROFILES_DIR}.')
+@click.option('--resume', is_flag=True, help='Resume the previous crawl of the same repo from its checkpoint.')
+@click.option('--seeds', 'seeds_path', default=None,
+              help='File with one starting repo url per line: run non-interactively for all of them, '
+                   'with tokens from the GITHUB_TOKENS or GITHUB_TOKEN environment variable.')
+@click.option('--output_dir', default='results', help='Directory for the per-seed results of --seeds.')
+@click.option('--serve', 'serve_port', default=None, type=int,
+              help='Serve similarity queries over the feature store profiles on this local port, '
+                   'with tokens for background refreshes from the GITHUB_TOKENS or GITHUB_TOKEN environment variable.')
 def print_similar_developers(candidates_count, stargazer_pages, repo_pages, repo_limit, top_repos_from_stargazers,
-                             commits_per_repo, print_popular_repos):
+                             commits_per_repo, print_popular_repos, backend, similar_to, top_k, index_path,
+                             incremental, metrics_path, profile, resume, seeds_path, output_dir, serve_port):
     constants.MAX_CANDIDATES_NUM = candidates_count
     constants.STARGAZER_PAGES_NUM = stargazer_pages
     constants.REPOS_PAGES_NUM = repo_pages
     constants.REPOS_LIMIT = repo_limit
     constants.N_REPOS_FROM_STARGAZERS = top_repos_from_stargazers
     constants.COMMITS_PER_REPO = commits_per_repo
+    constants.FETCH_BACKEND = backend
+    if profile:
+        metrics.profile_dir = constants.PROFILES_DIR
 
-    print('Enter github token:')
-    token = input()
-    constants.HEADERS['Authorization'] = 'token ' + token
+    if seeds_path is not None or serve_port is not None:
+        tokens = os.environ.get('GITHUB_TOKENS') or os.environ.get('GITHUB_TOKEN') or ''
+    else:
+        print('Enter github token (several tokens can be separated by commas):')
+        tokens = input()
+    constants.TOKENS = [token.strip() for token in tokens.split(',') if token.strip()]
+    if not constants.TOKENS:
+        raise click.UsageError('No github token given')
+    constants.HEADERS['Authorization'] = 'token ' + constants.TOKENS[0]
+
+    if serve_port is not None:
+        try:
+            asyncio.run(serve(port=serve_port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if metrics_path is not None:
+                metrics.write(metrics_path)
+        return
+
+    if seeds_path is not None:
+        checkpoint = Checkpoint()
+        try:
+            with metrics.stage('batch'):
+                asyncio.run(run_batch(read_seeds(seeds_path), output_dir, candidates_count,
+                                      FeatureStore() if incremental else None, checkpoint, resume))
+        finally:
+            checkpoint.close()
+            if metrics_path is not None:
+                metrics.write(metrics_path)
+        return
 
     print('Enter the url of the starting github repo')
     starting_repo_url = input()
-    aggregator = RepositoryAggregator(Repository(starting_repo_url))
+    checkpoint = Checkpoint()
+    aggregator = RepositoryAggregator(Repository(starting_repo_url), FeatureStore() if incremental else None,
+                                      checkpoint, resume)
 
-    asyncio.run(aggregator.get_repos())
+    try:
+        rank_similar_developers(aggregator, starting_repo_url, print_popular_repos, similar_to, top_k, index_path)
+    finally:
+        checkpoint.close()
+        if metrics_path is not None:
+            metrics.write(metrics_path)
 
-    if print_popular_repos:
-        print(f"Most common repos for stargazers of {starting_repo_url}: \n{aggregator.top_repos.most_common()}")
 
-    candidates = asyncio.run(aggregator.get_developers())
+def rank_similar_developers(aggregator: RepositoryAggregator, starting_repo_url: str, print_popular_repos: bool,
+                            similar_to: str, top_k: int, index_path: str) -> None:
+    """
+    Crawls the candidates and prints them, or the developers most similar to one of them
+    """
+    with metrics.stage('crawl'):
+        candidates = asyncio.run(crawl(aggregator, starting_repo_url, print_popular_repos))
     print('Gathered', len(candidates), 'candidates, limiting to', MAX_CANDIDATES_NUM)
 
-    for developer in candidates:
-        print(developer)
+    index = None
+    if index_path is not None:
+        with metrics.stage('index'):
+            index = AnnIndex(index_path)
+            for developer in candidates:
+                index.add(developer.url, developer.get_languages(), developer.get_variables())
+            index.save()
+
+    if similar_to is None:
+        for developer in candidates:
+            print(developer)
+        return
+
+    query = next((developer for developer in candidates if developer.url == similar_to), None)
+    if query is None:
+        raise click.UsageError(f'--similar_to {similar_to} is not one of the gathered developers')
+    with metrics.stage('similarity'):
+        if index is not None:
+            ranking = index.query(query.get_languages(), query.get_variables(), top_k + 1)
+            ranking = [(developer_id, similarity) for developer_id, similarity in ranking
+                       if developer_id != similar_to][:top_k]
+        else:
+            ranking = SimilarityEngine(candidates).top_k(query, top_k)
+    for developer, similarity in ranking:
+        print(f'{developer}\t{similarity:.4f}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import click
+import numpy as np
+
+from benchmark.fake_github import FakeGitHub
+from benchmark.synthetic_repo import generate_repository
+from model import constants
+from model.clone_cache import CloneCache
+from model.clone_pool import ClonePool
+from model.developer import Developer
+from model.features import IDENTIFIERS, LANGUAGES, FeatureCounts
+from model.fetcher import iter_stargazers, iter_starred_repos
+from model.github_session import GitHubSession
+from model.http_cache import ResponseCache
+from model.mining import mine_repository
+from model.repository import Repository
+from model.repository_aggregator import RepositoryAggregator
+from model.similarity import SimilarityEngine
+
+Report = Dict[str, Dict[str, float]]
+
+
+def _session(fake: FakeGitHub, workdir: str) -> GitHubSession:
+    # ttl 0 keeps the response cache in the path of every request without serving anything from it
+    return GitHubSession(['benchmark'], transport=fake.transport(),
+                         cache=ResponseCache(os.path.join(workdir, 'http_cache.sqlite'), ttl=0))
+
+
+async def bench_api(fake: FakeGitHub, seed_url: str, workdir: str) -> Dict[str, float]:
+    """
+    Fetches the stargazers of the seed repository and the starred repositories of every stargazer
+    """
+    async def starred(login: str) -> int:
+        return sum([len(page) async for page in iter_starred_repos(login, session)])
+
+    requests_before = fake.requests
+    start = time.perf_counter()
+    async with _session(fake, workdir) as session:
+        stargazers = [url async for page in iter_stargazers(seed_url, session) for url in page]
+        repos = await asyncio.gather(*[starred(url.split('/')[-1]) for url in stargazers])
+    seconds = time.perf_counter() - start
+    requests = fake.requests - requests_before
+    return {'seconds': seconds, 'requests': requests, 'requests_per_sec': requests / seconds,
+            'rate_limited': fake.rate_limited, 'stargazers': len(stargazers), 'starred_repos': sum(repos)}
+
+
+async def bench_clone(repo_urls: List[str], workdir: str) -> Dict[str, float]:
+    """
+    Clones every synthetic repository into an empty clone cache
+    """
+    pool = ClonePool(cache=CloneCache(os.path.join(workdir, 'clones')))
+    start = time.perf_counter()
+    paths = await asyncio.gather(*[pool.clone(url) for url in repo_urls])
+    seconds = time.perf_counter() - start
+    cloned_bytes = sum(os.path.getsize(os.path.join(root, file))
+                       for path in paths for root, _, files in os.walk(path) for file in files)
+    return {'seconds': seconds, 'clones': len(paths), 'clones_per_sec': len(paths) / seconds,
+            'bytes_cloned': cloned_bytes}
+
+
+def bench_mine(repo_urls: List[str], workdir: str) -> Dict[str, float]:
+    """
+    Mines every cloned repository in this process, without the blob cache
+    """
+    cache = CloneCache(os.path.join(workdir, 'clones'))
+    commits = files = 0
+    start = time.perf_counter()
+    for url in repo_urls:
+        result = mine_repository(url, cache.path_for(url), constants.COMMITS_PER_REPO, blob_cache_path=None)
+        commits += result.commits
+        files += result.files
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'commits': commits, 'files': files,
+            'commits_per_sec': commits / seconds, 'files_per_sec': files / seconds}
+
+
+def synthetic_developers(count: int, vocabulary_size: int, seed: int) -> List[Developer]:
+    """
+    Developers with Zipf-distributed random languages and identifiers counts
+    """
+    rng = np.random.default_rng(seed)
+    languages = LANGUAGES.intern_many(['Python', 'JavaScript', 'Java', 'Go', 'Ruby', 'C', 'C++', 'Rust'])
+    identifiers = IDENTIFIERS.intern_many(f'synthetic_identifier_{i}' for i in range(vocabulary_size))
+    developers = []
+    for number in range(count):
+        developer = Developer(f'synthetic{number}@example.com')
+        language_ids = rng.choice(languages, size=rng.integers(1, 4))
+        identifier_ids = identifiers[np.minimum(rng.zipf(1.3, size=rng.integers(20, 400)), vocabulary_size) - 1]
+        developer.languages = FeatureCounts.from_ids(language_ids, rng.integers(1, 100, size=len(language_ids)))
+        developer.variables = FeatureCounts.from_ids(identifier_ids, np.ones(len(identifier_ids), dtype=np.int64))
+        developers.append(developer)
+    return developers
+
+
+def bench_similarity(developers: List[Developer], queries: int, seed: int) -> Dict[str, float]:
+    """
+    Builds the similarity engine and ranks the most similar developers for random developers
+    """
+    start = time.perf_counter()
+    engine = SimilarityEngine(developers)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    latencies = []
+    for row in rng.integers(0, len(developers), size=queries):
+        start = time.perf_counter()
+        engine.top_k(developers[row])
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {'developers': len(developers), 'build_seconds': build_seconds,
+            'ranking_latency_mean_ms': float(latencies_ms.mean()),
+            'ranking_latency_p50_ms': float(np.percentile(latencies_ms, 50)),
+            'ranking_latency_p95_ms': float(np.percentile(latencies_ms, 95))}
+
+
+async def bench_pipeline(fake: FakeGitHub, seed_url: str, workdir: str) -> Dict[str, float]:
+    """
+    Runs the whole crawl, clone, mine and aggregate pipeline against the fake API and local repositories
+    """
+    aggregator = RepositoryAggregator(Repository(seed_url))
+    start = time.perf_counter()
+    async with _session(fake, workdir) as session:
+        developers = await aggregator.get_developers(session)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'repos': len(aggregator.repos), 'repos_per_sec': len(aggregator.repos) / seconds,
+            'developers': len(developers)}
+
+
+def print_report(report: Report) -> None:
+    for stage, metrics in report.items():
+        for metric, value in metrics.items():
+            print(f'{stage:<12}{metric:<28}{value:>14.3f}' if isinstance(value, float)
+                  else f'{stage:<12}{metric:<28}{value:>14}')
+
+
+@click.command()
+@click.option('--repos', default=20, help='Number of synthetic repositories.')
+@click.option('--users', default=300, help='Number of fake GitHub users.')
+@click.option('--stars_per_user', default=15, help='Number of repositories starred by each user.')
+@click.option('--page_size', default=30, help='Maximum page size of the fake API.')
+@click.option('--latency', default=0.0, help='Latency of every fake API response, in seconds.')
+@click.option('--rate_limit_every', default=0, help='Answer every n-th request with a rate limit error, 0 to disable.')
+@click.option('--commits', default=200, help='Number of commits in each synthetic repository.')
+@click.option('--files_per_commit', default=3, help='Number of files changed by each commit.')
+@click.option('--authors', default=8, help='Number of authors of each synthetic repository.')
+@click.option('--profiles', default=5000, help='Number of synthetic developer profiles for the ranking benchmark.')
+@click.option('--queries', default=200, help='Number of ranking queries.')
+@click.option('--seed', default=0, help='Seed of the generated data.')
+@click.option('--workdir', default=None, help='Directory for repositories and caches, a temporary one by default.')
+@click.option('--output', default=None, help='Path of the JSON report.')
+def run_benchmarks(repos, users, stars_per_user, page_size, latency, rate_limit_every, commits, files_per_commit,
+                   authors, profiles, queries, seed, workdir, output):
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix='similar_dev_search_benchmark_'))
+    os.makedirs(workdir, exist_ok=True)
+    if output is not None:
+        output = os.path.abspath(output)
+    # every default cache path is relative, so the pipeline and its worker processes use fresh caches in workdir
+    os.chdir(workdir)
+    constants.STARGAZER_PAGES_NUM = constants.REPOS_PAGES_NUM = 1000
+    constants.N_REPOS_FROM_STARGAZERS = repos
+    constants.COMMITS_PER_REPO = commits
+
+    start = time.perf_counter()
+    repo_urls = ['file://' + generate_repository(os.path.join(workdir, 'origins', f'owner{number % 5}',
+                                                                f'repo{number}'),
+                                                   commits, files_per_commit, authors, seed=seed + number)
+                 for number in range(repos)]
+    report: Report = {'generate': {'seconds': time.perf_counter() - start, 'repos': repos}}
+
+    fake = FakeGitHub(repo_urls, users, stars_per_user, page_size, latency, rate_limit_every, seed=seed)
+    seed_url = repo_urls[0]
+    report['api'] = asyncio.run(bench_api(fake, seed_url, workdir))
+    report['clone'] = asyncio.run(bench_clone(repo_urls, workdir))
+    report['mine'] = bench_mine(repo_urls, workdir)
+    report['similarity'] = bench_similarity(synthetic_developers(profiles, 50_000, seed), queries, seed)
+    report['pipeline'] = asyncio.run(bench_pipeline(fake, seed_url, workdir))
+
+    print(f'Benchmark data in {workdir}')
+    print_report(report)
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    run_benchmarks()
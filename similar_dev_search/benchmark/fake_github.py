@@ -0,0 +1,71 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+
+class FakeGitHub:
+    """
+    In-memory stand-in for the GitHub REST endpoints used by the fetcher: repository stargazers and
+    starred repositories of a user, paginated with Link headers like the real API.
+    Stars follow a Zipf-like popularity law, every response can be delayed by `latency` seconds
+    and every `rate_limit_every`-th request is answered with a 429 and a Retry-After header
+    """
+
+    def __init__(self, repo_urls: List[str], users: int, stars_per_user: int, page_size: int = 100,
+                 latency: float = 0.0, rate_limit_every: int = 0, rate_limit_seconds: float = 1.0, seed: int = 0):
+        self.repo_urls = {'/'.join(url.split('/')[-2:]): url for url in repo_urls}
+        self.page_size = page_size
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_seconds = rate_limit_seconds
+        self.requests = 0
+        self.rate_limited = 0
+
+        rng = random.Random(seed)
+        names = list(self.repo_urls)
+        weights = [1 / (rank + 1) for rank in range(len(names))]
+        self.starred: Dict[str, List[str]] = dict()
+        self.stargazers: Dict[str, List[str]] = defaultdict(list)
+        for user in range(users):
+            login = f'user{user}'
+            self.starred[login] = list(dict.fromkeys(rng.choices(names, weights, k=stars_per_user)))
+            for name in self.starred[login]:
+                self.stargazers[name].append(login)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        number = self.requests
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return httpx.Response(429, headers={'retry-after': str(self.rate_limit_seconds)})
+
+        parts = request.url.path.strip('/').split('/')
+        if len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'stargazers':
+            items = [{'login': login} for login in self.stargazers.get(parts[1] + '/' + parts[2], [])]
+        elif len(parts) == 3 and parts[0] == 'users' and parts[2] == 'starred' and parts[1] in self.starred:
+            items = [{'html_url': self.repo_urls[name]} for name in self.starred[parts[1]]]
+        else:
+            return httpx.Response(404, json={'message': 'Not Found'})
+        return self._page(request, items)
+
+    def _page(self, request: httpx.Request, items: list) -> httpx.Response:
+        page = int(request.url.params.get('page', 1))
+        per_page = min(int(request.url.params.get('per_page', 30)), self.page_size)
+        last = max((len(items) + per_page - 1) // per_page, 1)
+        headers = {'x-ratelimit-remaining': '5000', 'x-ratelimit-reset': str(int(time.time()) + 3600)}
+        if last > 1:
+            links = []
+            if page < last:
+                links.append(f'<{request.url.copy_merge_params({"page": page + 1})}>; rel="next"')
+            links.append(f'<{request.url.copy_merge_params({"page": last})}>; rel="last"')
+            headers['link'] = ', '.join(links)
+        return httpx.Response(200, json=items[(page - 1) * per_page:page * per_page], headers=headers)
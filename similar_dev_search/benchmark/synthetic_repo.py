@@ -0,0 +1,61 @@
+import os
+import random
+import subprocess
+from typing import Dict, List
+
+# line templates of the generated source files by extension, {} is an identifier
+LINE_TEMPLATES = {
+    '.py': '{} = compute({})\n',
+    '.js': 'const {} = compute({});\n',
+    '.java': 'int {} = compute({});\n',
+    '.go': '{} := compute({})\n',
+    '.rb': '{} = compute({})\n',
+}
+WORDS = ('count', 'total', 'index', 'buffer', 'result', 'value', 'node', 'item', 'offset', 'size', 'name', 'path')
+
+
+def _identifier(rng: random.Random) -> str:
+    return f'{rng.choice(WORDS)}_{rng.choice(WORDS)}_{rng.randrange(50)}'
+
+
+def generate_repository(path: str, commits: int, files_per_commit: int, authors: int,
+                        lines_per_commit: int = 10, seed: int = 0) -> str:
+    """
+    Creates a bare git repository with a linear history of synthetic source code commits, written with
+    git fast-import so that large histories take seconds
+    :param path: directory of the repository, must not exist
+    :param commits: number of commits
+    :param files_per_commit: number of files changed by each commit
+    :param authors: number of distinct commit authors
+    :param lines_per_commit: lines appended to each changed file
+    :param seed: seed of the random generator, the same seed gives the same repository
+    :return: path of the repository
+    """
+    rng = random.Random(seed)
+    subprocess.run(['git', 'init', '--bare', '-q', path], check=True)
+    subprocess.run(['git', 'config', 'uploadpack.allowFilter', 'true'], cwd=path, check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/master'], cwd=path, check=True)
+
+    paths = [f'src/module_{number}{rng.choice(list(LINE_TEMPLATES))}' for number in range(max(files_per_commit * 4, 1))]
+    contents: Dict[str, List[str]] = {file_path: [] for file_path in paths}
+    stream = []
+    timestamp = 1_600_000_000
+    for commit in range(1, commits + 1):
+        author = rng.randrange(authors)
+        timestamp += rng.randrange(60, 86400)
+        message = f'Commit {commit}\n'.encode()
+        stream.append(f'commit refs/heads/master\nmark :{commit}\n'
+                      f'author Author {author} <author{author}@example.com> {timestamp} +0000\n'
+                      f'committer Author {author} <author{author}@example.com> {timestamp} +0000\n'
+                      f'data {len(message)}\n'.encode() + message)
+        if commit > 1:
+            stream.append(f'from :{commit - 1}\n'.encode())
+        for file_path in rng.sample(paths, min(files_per_commit, len(paths))):
+            template = LINE_TEMPLATES[os.path.splitext(file_path)[1]]
+            contents[file_path].extend(template.format(_identifier(rng), _identifier(rng))
+                                       for _ in range(lines_per_commit))
+            data = ''.join(contents[file_path]).encode()
+            stream.append(f'M 100644 inline {file_path}\ndata {len(data)}\n'.encode() + data + b'\n')
+        stream.append(b'\n')
+    subprocess.run(['git', 'fast-import', '--quiet'], input=b''.join(stream), cwd=path, check=True)
+    return path
@@ -0,0 +1 @@
+# the package is run as a script directory, so its modules are imported as top-level `model`
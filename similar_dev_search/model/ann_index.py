@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Mapping, Tuple
+
+import numpy as np
+
+from model import constants
+
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def _splitmix64(values: np.ndarray) -> np.ndarray:
+    values = values + GOLDEN_GAMMA
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _feature_hashes(features: Mapping[str, int], prefix: str) -> Tuple[np.ndarray, np.ndarray]:
+    hashes = [int.from_bytes(hashlib.blake2b((prefix + feature).encode(), digest_size=8).digest(), 'little')
+              for feature, count in features.items() if count > 0]
+    weights = np.log1p(np.array([count for count in features.values() if count > 0], dtype=np.float64))
+    norm = np.linalg.norm(weights)
+    return np.array(hashes, dtype=np.uint64), weights / norm if norm > 0 else weights
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    return POPCOUNT[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1, dtype=np.int64)
+
+
+class SimHasher:
+    """
+    Random hyperplane (SimHash) signatures of weighted feature sets. Hyperplane coordinates are derived from
+    feature hashes, so signatures need neither a vocabulary nor a stored projection matrix
+    """
+
+    def __init__(self, tables: int, bits_per_table: int, languages_weight: float):
+        self.tables = tables
+        self.bits_per_table = bits_per_table
+        self.languages_weight = languages_weight
+        self._bit_seeds = np.arange(tables * bits_per_table, dtype=np.uint64) * GOLDEN_GAMMA
+
+    def project(self, languages: Mapping[str, int], variables: Mapping[str, int]) -> np.ndarray:
+        """
+        Projections of the weighted features on tables * bits_per_table random hyperplanes
+        """
+        projection = np.zeros(len(self._bit_seeds))
+        for features, prefix, weight in ((languages, 'l:', self.languages_weight),
+                                         (variables, 'v:', 1 - self.languages_weight)):
+            hashes, weights = _feature_hashes(features, prefix)
+            if len(hashes) == 0:
+                continue
+            signs = (_splitmix64(hashes[:, None] ^ self._bit_seeds[None, :]) >> np.uint64(63)).astype(np.float64)
+            projection += np.sqrt(weight) * (weights @ (1 - 2 * signs))
+        return projection
+
+    def keys(self, projection: np.ndarray) -> np.ndarray:
+        """
+        Packs signs of the projections into one uint64 key per table
+        """
+        bits = (projection > 0).reshape(self.tables, self.bits_per_table).astype(np.uint64)
+        return (bits << np.arange(self.bits_per_table, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+
+class Segment:
+    """
+    Immutable part of the index on disk: keys of every row and, for each table, row numbers sorted by key,
+    so bucket lookups are binary searches over memory-mapped arrays
+    """
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        self.keys = np.load(os.path.join(path, name + '.keys.npy'), mmap_mode='r')
+        self.sorted_keys = np.load(os.path.join(path, name + '.sorted_keys.npy'), mmap_mode='r')
+        self.order = np.load(os.path.join(path, name + '.order.npy'), mmap_mode='r')
+        with open(os.path.join(path, name + '.ids.json')) as ids_file:
+            self.ids: List[str] = json.load(ids_file)
+
+    @staticmethod
+    def write(path: str, name: str, ids: List[str], keys: np.ndarray) -> None:
+        order = np.argsort(keys, axis=0, kind='stable').T.astype(np.int32)
+        sorted_keys = np.take_along_axis(keys.T, order.astype(np.int64), axis=1)
+        np.save(os.path.join(path, name + '.keys.npy'), keys)
+        np.save(os.path.join(path, name + '.sorted_keys.npy'), np.ascontiguousarray(sorted_keys))
+        np.save(os.path.join(path, name + '.order.npy'), np.ascontiguousarray(order))
+        with open(os.path.join(path, name + '.ids.json'), 'w') as ids_file:
+            json.dump(ids, ids_file)
+
+    def bucket(self, table: int, key: np.uint64) -> np.ndarray:
+        sorted_keys = self.sorted_keys[table]
+        left = np.searchsorted(sorted_keys, key, side='left')
+        right = np.searchsorted(sorted_keys, key, side='right')
+        return self.order[table, left:right]
+
+
+class AnnIndex:
+    """
+    Persistent approximate nearest neighbour index over developer profiles.
+    Developers are hashed into `tables` SimHash tables of `bits_per_table` bits; a query reads its buckets
+    (plus `probes` neighbouring buckets per table, the recall/latency knob) and reranks the candidates
+    by the Hamming distance between full signatures. Inserts go to an in-memory segment until save().
+    Rows of a developer superseded by a newer profile stay in their segments, but are skipped by queries,
+    until a save past `max_segments` merges the segments
+    """
+
+    def __init__(self, path: str = None, tables: int = None, bits_per_table: int = None,
+                 languages_weight: float = None, max_segments: int = None):
+        self.path = path or constants.ANN_INDEX_PATH
+        self.max_segments = max_segments or constants.ANN_MAX_SEGMENTS
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                self.meta = json.load(meta_file)
+        else:
+            self.meta = {'tables': tables or constants.ANN_TABLES,
+                         'bits_per_table': bits_per_table or constants.ANN_BITS_PER_TABLE,
+                         'languages_weight': languages_weight if languages_weight is not None
+                         else constants.LANGUAGES_WEIGHT,
+                         'segments': []}
+        self.hasher = SimHasher(self.meta['tables'], self.meta['bits_per_table'], self.meta['languages_weight'])
+        self.segments = [Segment(self.path, name) for name in self.meta['segments']]
+        self._pending_ids: List[str] = []
+        self._pending_keys: List[np.ndarray] = []
+        # developer id -> (segment number, row) of the latest profile, the pending segment is numbered last
+        self._latest: Dict[str, Tuple[int, int]] = dict()
+        self._index_latest()
+
+    def _index_latest(self) -> None:
+        self._latest.clear()
+        for number, segment in enumerate(self.segments):
+            for row, developer_id in enumerate(segment.ids):
+                self._latest[developer_id] = (number, row)
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def add(self, developer_id: str, languages: Mapping[str, int], variables: Mapping[str, int]) -> None:
+        """
+        Inserts a developer profile, a newer profile of the same developer replaces the older one
+        :param developer_id: id of the developer
+        :param languages: languages counts
+        :param variables: variables counts
+        """
+        self._latest[developer_id] = (len(self.segments), len(self._pending_ids))
+        self._pending_ids.append(developer_id)
+        self._pending_keys.append(self.hasher.keys(self.hasher.project(languages, variables)))
+
+    def save(self) -> None:
+        """
+        Writes inserted profiles as a new segment, or merges all segments into one if there would be more than
+        max_segments of them
+        """
+        if not self._pending_ids:
+            return
+        name = f'segment-{self.meta.get("next_segment", len(self.meta["segments"])):05d}'
+        if len(self.segments) < self.max_segments:
+            Segment.write(self.path, name, self._pending_ids, np.stack(self._pending_keys))
+            merged = []
+            self.meta['segments'].append(name)
+        else:
+            ids, keys = self._latest_rows()
+            Segment.write(self.path, name, ids, keys)
+            merged = self.meta['segments']
+            self.meta['segments'] = [name]
+        self.meta['next_segment'] = int(name.split('-')[1]) + 1
+        tmp_meta_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_meta_path, 'w') as meta_file:
+            json.dump(self.meta, meta_file)
+        os.replace(tmp_meta_path, os.path.join(self.path, 'meta.json'))
+        # merged segments are deleted only once meta.json no longer refers to them
+        for merged_name in merged:
+            for suffix in ('.keys.npy', '.sorted_keys.npy', '.order.npy', '.ids.json'):
+                os.remove(os.path.join(self.path, merged_name + suffix))
+        # rows of the pending segment are already numbered as the appended segment
+        self.segments = self.segments + [Segment(self.path, name)] if not merged else [Segment(self.path, name)]
+        self._pending_ids = []
+        self._pending_keys = []
+        if merged:
+            self._index_latest()
+
+    def _latest_rows(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Returns ids and keys of the latest profile of every developer, saved or pending
+        """
+        ids = list(self._latest)
+        keys = np.empty((len(ids), self.hasher.tables), dtype=np.uint64)
+        for i, developer_id in enumerate(ids):
+            number, row = self._latest[developer_id]
+            keys[i] = self.segments[number].keys[row] if number < len(self.segments) else self._pending_keys[row]
+        return ids, keys
+
+    def _probe_keys(self, projection: np.ndarray, probes: int) -> List[List[np.uint64]]:
+        keys = self.hasher.keys(projection)
+        margins = np.abs(projection).reshape(self.hasher.tables, self.hasher.bits_per_table)
+        probe_keys = []
+        for table in range(self.hasher.tables):
+            table_keys = [keys[table]]
+            # the least confident bits are the most likely to differ for near neighbours
+            for bit in np.argsort(margins[table])[:probes]:
+                table_keys.append(keys[table] ^ (np.uint64(1) << np.uint64(bit)))
+            probe_keys.append(table_keys)
+        return probe_keys
+
+    def query(self, languages: Mapping[str, int], variables: Mapping[str, int], k: int = None,
+              probes: int = None) -> List[Tuple[str, float]]:
+        """
+        Approximate most similar developers
+        :param languages: languages counts of the query profile
+        :param variables: variables counts of the query profile
+        :param k: number of developers to return
+        :param probes: neighbouring buckets to read per table, more probes give better recall and slower queries
+        :return: developer ids with estimated cosine similarities, most similar first
+        """
+        k = k or constants.SIMILAR_DEVELOPERS_NUM
+        probes = probes if probes is not None else constants.ANN_PROBES
+        projection = self.hasher.project(languages, variables)
+        query_keys = self.hasher.keys(projection)
+        probe_keys = self._probe_keys(projection, probes)
+
+        candidates: Dict[str, np.ndarray] = dict()
+        for number, segment in enumerate(self.segments):
+            rows = set()
+            for table, table_keys in enumerate(probe_keys):
+                for key in table_keys:
+                    rows.update(segment.bucket(table, key).tolist())
+            for row in rows:
+                if self._latest[segment.ids[row]] == (number, row):
+                    candidates[segment.ids[row]] = segment.keys[row]
+        pending_number = len(self.segments)
+        for row, (developer_id, keys) in enumerate(zip(self._pending_ids, self._pending_keys)):
+            if self._latest[developer_id] == (pending_number, row) and \
+                    any(keys[table] in table_keys for table, table_keys in enumerate(probe_keys)):
+                candidates[developer_id] = keys
+
+        if not candidates:
+            return []
+        ids = list(candidates)
+        distances = _popcount(np.stack([candidates[developer_id] for developer_id in ids]) ^ query_keys).sum(axis=1)
+        similarities = np.cos(np.pi * distances / (self.hasher.tables * self.hasher.bits_per_table))
+        top = np.argsort(-similarities, kind='stable')[:k]
+        return [(ids[i], float(similarities[i])) for i in top]
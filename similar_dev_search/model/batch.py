@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+from typing import Dict, Hashable, List
+
+from model.checkpoint import Checkpoint
+from model.coalescer import Coalescer
+from model.developer import Developer
+from model.developer_entry import DeveloperEntry
+from model.feature_store import FeatureStore
+from model.features import FeatureCounts
+from model.github_session import GitHubSession
+from model.repository import Repository
+from model.repository_aggregator import RepositoryAggregator
+from model.similarity import SimilarityEngine
+
+
+def read_seeds(path: str) -> List[str]:
+    """
+    Reads seed repository urls, one per line. Empty lines and lines starting with # are skipped
+    :param path: path of the seeds file
+    :return: unique seed urls in the order of the file
+    """
+    with open(path) as seeds_file:
+        seeds = [line.strip() for line in seeds_file]
+    return list(dict.fromkeys(seed.rstrip('/') for seed in seeds if seed and not seed.startswith('#')))
+
+
+def repository_profile(url: str, developers: Dict[Hashable, DeveloperEntry]) -> Developer:
+    """
+    Profile of a repository: languages and variables of all its mined developers together
+    :param url: url of the repository
+    :param developers: mined developers of the repository
+    :return: developer-like profile to rank developers against
+    """
+    profile = Developer(url)
+    profile.languages = FeatureCounts.merge([entry.languages for entry in developers.values()])
+    profile.variables = FeatureCounts.merge([entry.variables for entry in developers.values()])
+    return profile
+
+
+def results_path(output_dir: str, seed_url: str) -> str:
+    owner, name = seed_url.rstrip('/').split('/')[-2:]
+    return os.path.join(output_dir, f'{owner}_{name}.json')
+
+
+def write_results(path: str, results: dict) -> None:
+    """
+    Writes results atomically, so an interrupted batch never leaves a truncated file
+    """
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or '.', delete=False) as results_file:
+        json.dump(results, results_file, indent=2)
+    os.replace(results_file.name, path)
+
+
+async def run_batch(seed_urls: List[str], output_dir: str, ranked_num: int, feature_store: FeatureStore = None,
+                    checkpoint: Checkpoint = None, resume: bool = False, session: GitHubSession = None) -> None:
+    """
+    Crawls every seed repository in one session. Starred repositories of a stargazer and mining results of
+    a repository are computed once and shared by all the seeds, so the work grows with the number of unique
+    repositories. For every seed, the gathered developers are ranked by similarity to the seed repository
+    :param seed_urls: urls of the seed repositories
+    :param output_dir: directory to write a json file of results per seed to
+    :param ranked_num: number of developers to rank for each seed
+    :param feature_store: store of profiles accumulated across runs, mine only new commits if given
+    :param checkpoint: checkpoint to save progress to
+    :param resume: whether to resume the crawls from the checkpoint
+    :param session: GitHub session to perform requests from
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if session is None:
+        github_session = GitHubSession()
+    else:
+        github_session = session
+
+    shared = Coalescer()
+    for number, seed_url in enumerate(seed_urls, 1):
+        print(f'Seed {number}/{len(seed_urls)}: {seed_url}')
+        seed_repo = Repository(seed_url)
+        aggregator = RepositoryAggregator(seed_repo, feature_store, checkpoint, resume, shared)
+        developers = await aggregator.get_developers(github_session)
+        seed_developers = await shared.run('seed:' + seed_url, seed_repo.get_developers)
+
+        ranking = SimilarityEngine(developers).top_k(repository_profile(seed_url, seed_developers), ranked_num)
+        write_results(results_path(output_dir, seed_url), {
+            'seed': seed_url,
+            'top_repos': aggregator.top_repos.most_common(len(aggregator.repos or [])),
+            'developers': [[developer.url, similarity] for developer, similarity in ranking],
+        })
+        print(f'{len(developers)} developers, {len(shared)} shared crawl and mining results so far')
+
+    if session is None:
+        await github_session.aclose()
@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+from model import constants
+
+SQLITE_MAX_VARIABLES = 500
+# access times are written in batches, a write transaction per lookup would serialize the worker processes
+ACCESS_BATCH_SIZE = 100
+
+BlobInfo = Tuple[str, Dict[str, int]]
+
+
+class BlobCache:
+    """
+    Persistent cache of extraction results keyed by language and git blob ids (see mining.extraction_key):
+    the same contents are parsed once across commits, forks, repositories and runs.
+    Safe to share between worker processes
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or constants.BLOB_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else constants.BLOB_CACHE_MAX_BYTES
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=60)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, language TEXT, '
+                                 'identifiers BLOB, size INTEGER, accessed_at REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS blobs_accessed_at ON blobs (accessed_at)')
+        # running total of the sizes, kept by triggers so that no put has to sum the whole table
+        self._connection.execute('PRAGMA recursive_triggers = ON')  # rows replaced by a put fire the delete trigger
+        self._connection.execute('BEGIN IMMEDIATE')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS blobs_size (total INTEGER)')
+        if self._connection.execute('SELECT total FROM blobs_size').fetchone() is None:
+            self._connection.execute('INSERT INTO blobs_size SELECT COALESCE(SUM(size), 0) FROM blobs')
+        self._connection.execute('CREATE TRIGGER IF NOT EXISTS blobs_inserted AFTER INSERT ON blobs '
+                                 'BEGIN UPDATE blobs_size SET total = total + NEW.size; END')
+        self._connection.execute('CREATE TRIGGER IF NOT EXISTS blobs_deleted AFTER DELETE ON blobs '
+                                 'BEGIN UPDATE blobs_size SET total = total - OLD.size; END')
+        self._connection.commit()
+        self._accessed: Dict[str, float] = dict()
+
+    def __enter__(self) -> 'BlobCache':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get_many(self, shas: Iterable[str]) -> Dict[str, BlobInfo]:
+        """
+        Looks up cached results
+        :param shas: blob ids
+        :return: dict with blob id key and (language, identifiers counts) value, only for cached blobs
+        """
+        shas = list(shas)
+        found = dict()
+        for start in range(0, len(shas), SQLITE_MAX_VARIABLES):
+            chunk = shas[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._connection.execute(f'SELECT sha, language, identifiers FROM blobs '
+                                            f'WHERE sha IN ({placeholders})', chunk).fetchall()
+            now = time.time()
+            for sha, language, identifiers in rows:
+                found[sha] = (language, json.loads(zlib.decompress(identifiers)))
+                self._accessed[sha] = now
+        if len(self._accessed) >= ACCESS_BATCH_SIZE:
+            with self._connection:
+                self._write_accessed()
+        return found
+
+    def _write_accessed(self) -> None:
+        # the caller commits
+        self._connection.executemany('UPDATE blobs SET accessed_at = ? WHERE sha = ?',
+                                     [(accessed_at, sha) for sha, accessed_at in self._accessed.items()])
+        self._accessed.clear()
+
+    def put_many(self, results: Dict[str, BlobInfo]) -> None:
+        """
+        Stores extraction results and evicts least recently used blobs once the cache grows past max_bytes
+        :param results: dict with blob id key and (language, identifiers counts) value
+        """
+        now = time.time()
+        rows: List[Tuple[str, str, bytes, int, float]] = []
+        for sha, (language, identifiers) in results.items():
+            compressed = zlib.compress(json.dumps(identifiers).encode())
+            rows.append((sha, language, compressed, len(sha) + len(language) + len(compressed), now))
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?)', rows)
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def size(self) -> int:
+        """
+        Returns total size of the cached blobs, in bytes
+        """
+        return self._connection.execute('SELECT total FROM blobs_size').fetchone()[0]
+
+    def evict(self) -> None:
+        """
+        Removes least recently used blobs down to BLOB_CACHE_EVICT_TO of max_bytes, if the cache is above max_bytes
+        """
+        with self._connection:
+            self._write_accessed()
+            total = self.size()
+            if total <= self.max_bytes:
+                return
+            # drop the least recently used rows whose sizes add up to the excess
+            self._connection.execute('DELETE FROM blobs WHERE sha IN (SELECT sha FROM (SELECT sha, size, SUM(size) '
+                                     'OVER (ORDER BY accessed_at, sha) AS running FROM blobs) WHERE running - size < ?)',
+                                     (total - int(self.max_bytes * constants.BLOB_CACHE_EVICT_TO),))
+
+    def flush(self) -> None:
+        """
+        Writes the pending access times
+        """
+        with self._connection:
+            self._write_accessed()
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from model import constants
+from model.mining import RepoMiningResult
+
+
+def crawl_settings() -> str:
+    """
+    Settings the crawl state depends on, a checkpoint made with other settings is not resumed
+    """
+    return json.dumps({'stargazer_pages': constants.STARGAZER_PAGES_NUM, 'repos_pages': constants.REPOS_PAGES_NUM,
+                       'top_repos': constants.N_REPOS_FROM_STARGAZERS, 'backend': constants.FETCH_BACKEND},
+                      sort_keys=True)
+
+
+class Checkpoint:
+    """
+    Durable progress of crawls: stargazers of each seed repository, starred repositories of each stargazer,
+    the ranked repositories and the results of mined repositories, all scoped to the seed.
+    Writes are committed as SQLite transactions at most every CHECKPOINT_INTERVAL_SECONDS and on flush(),
+    so a crash loses only the last interval and never leaves a half-written checkpoint
+    """
+
+    def __init__(self, path: str = None, interval: float = None):
+        self.path = path or constants.CHECKPOINT_PATH
+        self.interval = interval if interval is not None else constants.CHECKPOINT_INTERVAL_SECONDS
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=60)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS seeds (seed TEXT PRIMARY KEY, settings TEXT, stargazers TEXT, ranking TEXT);
+            CREATE TABLE IF NOT EXISTS fetched_stargazers (seed TEXT, stargazer TEXT, PRIMARY KEY (seed, stargazer));
+            CREATE TABLE IF NOT EXISTS starred (seed TEXT, stargazer TEXT, repos TEXT, PRIMARY KEY (seed, stargazer));
+            CREATE TABLE IF NOT EXISTS mined_repos (seed TEXT, url TEXT, commits_limit INTEGER, result BLOB,
+                                                    PRIMARY KEY (seed, url));
+        ''')
+        self._connection.commit()
+        self._committed_at = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+    def __enter__(self) -> 'Checkpoint':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def flush(self) -> None:
+        """
+        Commits everything saved so far
+        """
+        self._connection.commit()
+        self._committed_at = time.monotonic()
+
+    def _saved(self) -> None:
+        if time.monotonic() - self._committed_at >= self.interval:
+            self.flush()
+
+    def start(self, seed: str, resume: bool) -> None:
+        """
+        Prepares the crawl state of a seed repository: keeps it to resume from if it was made with the same settings,
+        clears it otherwise
+        :param seed: url of the seed repository
+        :param resume: whether to resume the previous crawl of the seed
+        """
+        row = self._connection.execute('SELECT settings FROM seeds WHERE seed = ?', (seed,)).fetchone()
+        if resume and row is not None and row[0] == crawl_settings():
+            return
+        with self._connection:
+            self._connection.execute('DELETE FROM fetched_stargazers WHERE seed = ?', (seed,))
+            self._connection.execute('DELETE FROM starred WHERE seed = ?', (seed,))
+            self._connection.execute('DELETE FROM mined_repos WHERE seed = ?', (seed,))
+            self._connection.execute('INSERT OR REPLACE INTO seeds VALUES (?, ?, NULL, NULL)',
+                                     (seed, crawl_settings()))
+        self._committed_at = time.monotonic()
+
+    def _seed_column(self, seed: str, column: str) -> Optional[List[str]]:
+        row = self._connection.execute(f'SELECT {column} FROM seeds WHERE seed = ?', (seed,)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def stargazers(self, seed: str) -> Optional[List[str]]:
+        """
+        Returns all stargazers of the seed repository, None if they were not all fetched
+        """
+        return self._seed_column(seed, 'stargazers')
+
+    def save_stargazers(self, seed: str, stargazers: List[str]) -> None:
+        self._connection.execute('UPDATE seeds SET stargazers = ? WHERE seed = ?', (json.dumps(stargazers), seed))
+        self._saved()
+
+    def fetched_stargazers(self, seed: str) -> List[str]:
+        """
+        Returns stargazers of the pages fetched so far, in the order they were saved
+        """
+        return [stargazer for stargazer, in self._connection.execute(
+            'SELECT stargazer FROM fetched_stargazers WHERE seed = ? ORDER BY rowid', (seed,))]
+
+    def save_stargazers_page(self, seed: str, stargazers: List[str]) -> None:
+        self._connection.executemany('INSERT OR IGNORE INTO fetched_stargazers VALUES (?, ?)',
+                                     [(seed, stargazer) for stargazer in stargazers])
+        self._saved()
+
+    def starred(self, seed: str) -> Dict[str, List[str]]:
+        """
+        Returns starred repositories of the stargazers whose starred pages were all fetched
+        :return: dict with stargazer url key and list of repository urls value
+        """
+        return {stargazer: json.loads(repos) for stargazer, repos in self._connection.execute(
+            'SELECT stargazer, repos FROM starred WHERE seed = ?', (seed,))}
+
+    def save_starred(self, seed: str, stargazer: str, repos: List[str]) -> None:
+        self._connection.execute('INSERT OR REPLACE INTO starred VALUES (?, ?, ?)',
+                                 (seed, stargazer, json.dumps(repos)))
+        self._saved()
+
+    def ranking(self, seed: str) -> Optional[List[str]]:
+        """
+        Returns urls of the top repositories of the seed, None if the ranking was not finished
+        """
+        return self._seed_column(seed, 'ranking')
+
+    def save_ranking(self, seed: str, repos: List[str]) -> None:
+        self._connection.execute('UPDATE seeds SET ranking = ? WHERE seed = ?', (json.dumps(repos), seed))
+        self.flush()
+
+    def mined(self, seed: str, url: str) -> Optional[RepoMiningResult]:
+        """
+        Returns the result of a repository mined for the seed with the current COMMITS_PER_REPO,
+        None if it was not mined
+        """
+        row = self._connection.execute('SELECT result FROM mined_repos WHERE seed = ? AND url = ? '
+                                       'AND commits_limit = ?', (seed, url, constants.COMMITS_PER_REPO)).fetchone()
+        if row is None:
+            return None
+        developers, commits, files, head = json.loads(zlib.decompress(row[0]))
+        return RepoMiningResult(url, {author: tuple(profile) for author, profile in developers.items()},
+                                commits, files, head=head)
+
+    def save_mined(self, seed: str, result: RepoMiningResult) -> None:
+        """
+        Stores the result of a repository successfully mined for the seed
+        """
+        data = zlib.compress(json.dumps([result.developers, result.commits, result.files, result.head]).encode())
+        self._connection.execute('INSERT OR REPLACE INTO mined_repos VALUES (?, ?, ?, ?)',
+                                 (seed, result.url, constants.COMMITS_PER_REPO, data))
+        self._saved()
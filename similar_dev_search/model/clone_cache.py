@@ -0,0 +1,189 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from git import Repo
+
+from model import constants
+from model.git_miner import is_ancestor, shallow_commits
+from model.metrics import metrics
+
+
+def _repo_size(path: str) -> int:
+    """
+    Size of the object database of a clone in bytes, from git count-objects instead of walking the tree
+    """
+    counts = dict(line.split(': ', 1) for line in Repo(path).git.count_objects('-v').splitlines())
+    return (int(counts.get('size', 0)) + int(counts.get('size-pack', 0))) * 1024
+
+
+def repo_key(url: str) -> str:
+    """
+    Returns cache key of the repository: hash of lowercase owner/name, so forks with the same name do not collide
+    :param url: url of the repository
+    :return: hex digest
+    """
+    owner, name = url.rstrip('/').removesuffix('.git').split('/')[-2:]
+    return hashlib.sha1(f'{owner}/{name}'.lower().encode()).hexdigest()
+
+
+class CloneCache:
+    """
+    On-disk cache of shallow clones shared between runs.
+    Layout of the root directory:
+        entries/<key>/   - clone of the repository
+        meta/<key>.json  - url, size in bytes and last use time of the entry
+        locks/<key>.lock - lock held while the entry is cloned, fetched or evicted
+        tmp/             - unfinished clones, moved to entries/ atomically
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or constants.CLONES_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else constants.CLONE_CACHE_MAX_BYTES
+        for directory in ('entries', 'meta', 'locks', 'tmp'):
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+
+    def path_for(self, url: str) -> str:
+        return os.path.join(self.root, 'entries', repo_key(url))
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, 'meta', key + '.json')
+
+    @contextmanager
+    def _lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        with open(os.path.join(self.root, 'locks', name + '.lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_meta(self, key: str, url: str, path: str) -> int:
+        meta_path = self._meta_path(key)
+        size = _repo_size(path)
+        with tempfile.NamedTemporaryFile('w', dir=os.path.join(self.root, 'tmp'), delete=False) as meta_file:
+            json.dump({'url': url, 'size': size, 'last_used': time.time()}, meta_file)
+        os.replace(meta_file.name, meta_path)
+        return size
+
+    def _cached_size(self, key: str) -> int:
+        try:
+            with open(self._meta_path(key)) as meta_file:
+                return json.load(meta_file)['size']
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _clone(self, url: str, path: str, depth: int) -> None:
+        tmp_path = tempfile.mkdtemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            # mining reads blobs through cat-file only, a checkout would download every blob of HEAD
+            Repo.clone_from(url, tmp_path, depth=depth, filter='blob:none', single_branch=True, no_tags=True,
+                            no_checkout=True)
+            os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def _fetch(path: str, depth: int) -> None:
+        repo = Repo(path)
+        repo.git.fetch('origin', depth=depth, filter='blob:none', no_tags=True)
+        # nothing is checked out, only the branch has to move
+        repo.git.reset('--soft', 'FETCH_HEAD')
+
+    @staticmethod
+    def _deepen(path: str, depth: int, since: str) -> None:
+        """
+        Deepens a shallow clone until the commit is reachable from HEAD, so only commits after it can be mined.
+        Gives up after CLONE_DEEPEN_STEPS fetches, the commit is then too far behind HEAD to be worth it
+        """
+        repo = Repo(path)
+        for _ in range(constants.CLONE_DEEPEN_STEPS):
+            if not shallow_commits(path) or is_ancestor(path, since):
+                return
+            repo.git.fetch('origin', deepen=depth, filter='blob:none', no_tags=True)
+        metrics.inc('clone_deepen_exhausted')
+
+    def checkout(self, url: str, depth: int = None, since: Optional[str] = None) -> str:
+        """
+        Returns path to an up-to-date clone of the repository: fetches new commits into a cached clone,
+        clones only if the repository is not in the cache yet
+        :param url: url of the repository
+        :param depth: number of commits to fetch
+        :param since: commit mined by a previous run, the clone is deepened until it is reachable from HEAD
+        :return: path to the clone
+        """
+        # one commit more than mined: the oldest commit of a shallow clone is a boundary that is not mined
+        depth = max(depth or constants.COMMITS_PER_REPO, 1) + 1
+        key = repo_key(url)
+        path = self.path_for(url)
+        start = time.perf_counter()
+        with self._lock(key):
+            size_before = self._cached_size(key)
+            if os.path.isdir(os.path.join(path, '.git')):
+                try:
+                    self._fetch(path, depth)
+                except Exception as error:
+                    print('Could not update cached clone of ' + url + ', cloning again: ' + str(error))
+                    shutil.rmtree(path, ignore_errors=True)
+            if not os.path.isdir(os.path.join(path, '.git')):
+                shutil.rmtree(path, ignore_errors=True)
+                self._clone(url, path, depth)
+            if since is not None:
+                try:
+                    self._deepen(path, depth, since)
+                except Exception as error:
+                    print('Could not deepen clone of ' + url + ': ' + str(error))
+            size = self._write_meta(key, url, path)
+            metrics.inc('clone_bytes', max(size - size_before, 0))
+        metrics.inc('clones')
+        metrics.observe('clone_seconds', time.perf_counter() - start)
+        self.evict(keep=key)
+        return path
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for meta_name in os.listdir(os.path.join(self.root, 'meta')):
+            if not meta_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, 'meta', meta_name)) as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta['last_used'], meta['size'], meta_name.removesuffix('.json')))
+        return entries
+
+    def evict(self, keep: str = None) -> None:
+        """
+        Removes least recently used entries until the cache fits into max_bytes.
+        Entries used in the last CLONE_CACHE_GRACE_SECONDS are kept, they may be mined by another run right now
+        :param keep: key of an entry that must not be evicted
+        """
+        with self._lock('.evict', blocking=False) as acquired:
+            if not acquired:
+                return
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            grace_deadline = time.time() - constants.CLONE_CACHE_GRACE_SECONDS
+            for last_used, size, key in entries:
+                if total <= self.max_bytes or last_used > grace_deadline:
+                    break
+                if key == keep:
+                    continue
+                with self._lock(key, blocking=False) as entry_acquired:
+                    if not entry_acquired:
+                        continue
+                    os.remove(self._meta_path(key))
+                    shutil.rmtree(os.path.join(self.root, 'entries', key), ignore_errors=True)
+                    total -= size
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Optional
+
+from model import constants
+from model.clone_cache import CloneCache
+from model.coalescer import Coalescer
+
+
+class ClonePool:
+    """
+    Clones repositories off the event loop, with at most `concurrency` clones running at once.
+    Clones are shallow and blobless and go through the on-disk clone cache.
+    With keep_clones, a repository is cloned or fetched once per event loop, otherwise every call after
+    the previous one finished fetches it again. Failed clones are always retried by the next call
+    """
+
+    def __init__(self, concurrency: int = None, cache: CloneCache = None, keep_clones: bool = True):
+        self.concurrency = concurrency or constants.CLONE_CONCURRENCY
+        self.keep_clones = keep_clones
+        self._cache = cache
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._clones = Coalescer(keep_results=keep_clones)
+
+    @property
+    def cache(self) -> CloneCache:
+        if self._cache is None:
+            self._cache = CloneCache()
+        return self._cache
+
+    def _bind_loop(self) -> None:
+        # __main__ runs several asyncio.run phases, semaphore and futures must belong to the current loop
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._clones = Coalescer(keep_results=self.keep_clones)
+
+    async def clone(self, url: str, since: Optional[str] = None) -> str:
+        """
+        Clones the repository or updates its cached clone, concurrent calls for the same url share the same clone
+        :param url: url of the repository
+        :param since: commit mined by a previous run, fetched history reaches it if possible
+        :return: path of the clone
+        """
+        self._bind_loop()
+        return await self._clones.run(url, lambda: self._run(url, since))
+
+    async def _run(self, url: str, since: Optional[str]) -> str:
+        async with self._semaphore:
+            return await asyncio.to_thread(self.cache.checkout, url, constants.COMMITS_PER_REPO, since)
+
+
+default_pool = ClonePool()
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class Coalescer:
+    """
+    Runs one computation per key: concurrent calls with the same key await the same future.
+    With keep_results, finished results are kept and later calls get them without computing again;
+    failed computations are always forgotten, so they can be retried
+    """
+
+    def __init__(self, keep_results: bool = True):
+        self.keep_results = keep_results
+        self._futures: Dict[Hashable, asyncio.Future] = dict()
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._futures
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Returns the result of compute() for the key, computing it only if no call with the key is running or kept
+        :param key: key of the computation
+        :param compute: function starting the computation
+        :return: result of the computation
+        """
+        future = self._futures.get(key)
+        if future is None:
+            future = self._futures[key] = asyncio.ensure_future(compute())
+            future.add_done_callback(lambda done: self._forget(key, done))
+        # a cancelled caller must not cancel the computation the other callers are waiting for
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._futures.get(key) is not future:
+            return
+        if not self.keep_results or future.cancelled() or future.exception() is not None:
+            del self._futures[key]
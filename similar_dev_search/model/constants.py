@@ -10,3 +10,67 @@ N_REPOS_FROM_STARGAZERS = 100
 
 COMMITS_PER_REPO = 5
 
+
+CLONES_DIR = 'repositories'
+CLONE_CONCURRENCY = 8
+CLONE_CACHE_MAX_BYTES = 10 * 1024 ** 3
+CLONE_CACHE_GRACE_SECONDS = 60 * 60
+# times a cached clone is deepened by COMMITS_PER_REPO commits to reach the previously mined HEAD
+CLONE_DEEPEN_STEPS = 4
+
+HTTP_CACHE_PATH = '.cache/http_cache.sqlite'
+HTTP_CACHE_TTL_SECONDS = 10 * 60
+HTTP_CACHE_MAX_ENTRIES = 100_000
+
+TOKENS = []
+MAX_CONCURRENT_REQUESTS = 32
+MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 1.0
+MAX_RETRY_BACKOFF_SECONDS = 60.0
+# GitHub asks to wait at least a minute after a secondary rate limit, doubled after every further one
+SECONDARY_RATE_LIMIT_BACKOFF_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+FETCH_BACKEND = 'rest'
+GRAPHQL_URL = 'https://api.github.com/graphql'
+GRAPHQL_BATCH_SIZE = 25
+GRAPHQL_BATCH_DELAY_SECONDS = 0.05
+
+MINING_WORKERS = None
+MINING_TIMEOUT_SECONDS = 10 * 60
+
+LANGUAGES_WEIGHT = 0.5
+SIMILAR_DEVELOPERS_NUM = 10
+
+ANN_INDEX_PATH = '.cache/ann_index'
+ANN_TABLES = 32
+ANN_BITS_PER_TABLE = 10
+ANN_PROBES = 2
+# saving past this many segments merges them into one, without the rows of superseded profiles
+ANN_MAX_SEGMENTS = 8
+
+CONTENT_SNIFF_BYTES = 8 * 1024
+
+BLOB_CACHE_PATH = '.cache/blob_cache.sqlite'
+BLOB_CACHE_MAX_BYTES = 1024 ** 3
+# eviction shrinks the cache to this fraction of BLOB_CACHE_MAX_BYTES, so that it runs once per many puts
+BLOB_CACHE_EVICT_TO = 0.9
+
+FEATURE_STORE_PATH = '.cache/features.sqlite'
+
+PIPELINE_QUEUE_SIZE = 1000
+STARGAZERS_CONCURRENCY = 32
+TOP_REPOS_CAPACITY = 10_000
+PAGES_CONCURRENCY = 8
+PROFILES_DIR = '.cache/profiles'
+CHECKPOINT_PATH = '.cache/checkpoint.sqlite'
+CHECKPOINT_INTERVAL_SECONDS = 10.0
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8080
+SERVICE_PROFILES_CACHE_SIZE = 10_000
+# a failed refresh is retried after this many seconds, doubled after every further failure
+SERVICE_RETRY_SECONDS = 30.0
+SERVICE_MAX_RETRY_SECONDS = 60 * 60
+# the similarity engine is rebuilt from the feature store at most this often, profiles refreshed meanwhile
+# are answered from memory
+SERVICE_RELOAD_SECONDS = 60.0
@@ -1,55 +1,64 @@
-from collections import defaultdict
-from typing import List
-
-import httpx
+from typing import Dict, List, Mapping, Union
 
 import model.fetcher as fetcher
+from model.features import IDENTIFIERS, LANGUAGES, FeatureCounts
+from model.github_session import GitHubSession
 from model.repository import Repository
 
 
 class Developer:
+    __slots__ = ('language_features', 'variable_features', 'repos', 'url', 'id')
+
     def __init__(self, url: str):
-        self.languages = defaultdict(int)
-        self.variables = defaultdict(int)
+        self.language_features = FeatureCounts()
+        self.variable_features = FeatureCounts()
         self.repos = None
 
         self.url = url
-        url = url.replace('https://', '')
-        url_prefix, id = url.split('/')
-        self.id = id
+        # mined developers are identified by their commit email instead of a profile url
+        self.id = url.rstrip('/').split('/')[-1]
 
-    async def get_stargazed_repos(self, asyncio_client: httpx.AsyncClient = None) -> List[Repository]:
+    async def get_stargazed_repos(self, session: GitHubSession = None) -> List[Repository]:
 
         """
         Gets list of stargazed repositories
-        :param asyncio_client: asyncio client to perform requests from
+        :param session: GitHub session to perform requests from
         :return: stargazed repositories
         """
-        page_url_template = "https://api.github.com/users/" + self.id + "/starred?page={}&per_page=100"
+        page_url_template = "https://api.github.com/users/{}/starred?page={}&per_page=100"
+
+        return await fetcher.fetch_all_repos_for_developer(page_url_template, self.id, session)
+
+    @property
+    def languages(self) -> Dict[str, int]:
+        return self.language_features.to_dict(LANGUAGES)
 
-        if asyncio_client is None:
-            client = httpx.AsyncClient(timeout=None)
-        else:
-            client = asyncio_client
+    @languages.setter
+    def languages(self, languages: Union[FeatureCounts, Mapping[str, int]]) -> None:
+        if not isinstance(languages, FeatureCounts):
+            languages = FeatureCounts.from_dict(languages, LANGUAGES)
+        self.language_features = languages
 
-        starred_repos = await fetcher.fetch_all_repos_for_developer(page_url_template, self.id, client)
-        if asyncio_client is None:
-            await client.aclose()
+    @property
+    def variables(self) -> Dict[str, int]:
+        return self.variable_features.to_dict(IDENTIFIERS)
 
-        return starred_repos
+    @variables.setter
+    def variables(self, variables: Union[FeatureCounts, Mapping[str, int]]) -> None:
+        if not isinstance(variables, FeatureCounts):
+            variables = FeatureCounts.from_dict(variables, IDENTIFIERS)
+        self.variable_features = variables
 
-    def get_languages(self) -> defaultdict[int]:
+    def get_languages(self) -> Dict[str, int]:
         """
         Gets dict of languages used by the developer
-        :param asyncio_client: asyncio client to perform requests from
         :return: dict with language key and number of occurrences value
         """
         return self.languages
 
-    def get_variables(self) -> defaultdict[int]:
+    def get_variables(self) -> Dict[str, int]:
         """
         Gets dict of variables used by the developer
-        :param asyncio_client:  asyncio client to perform requests from
         :return: dict with variable key and number of occurrences value
         """
         return self.variables
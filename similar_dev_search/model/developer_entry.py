@@ -1,9 +1,21 @@
-from typing import Tuple, Counter
+from typing import Iterator, Mapping
+
+from model.features import IDENTIFIERS, LANGUAGES, FeatureCounts
 
 
 class DeveloperEntry:
-    def __init__(self):
-        self.data = Tuple[Counter, Counter]()
+    __slots__ = ('languages', 'variables')
+
+    def __init__(self, languages: FeatureCounts = None, variables: FeatureCounts = None):
+        self.languages = languages if languages is not None else FeatureCounts()
+        self.variables = variables if variables is not None else FeatureCounts()
+
+    @classmethod
+    def from_dicts(cls, languages: Mapping[str, int], variables: Mapping[str, int]) -> 'DeveloperEntry':
+        return cls(FeatureCounts.from_dict(languages, LANGUAGES), FeatureCounts.from_dict(variables, IDENTIFIERS))
+
+    def __getitem__(self, item) -> FeatureCounts:
+        return (self.languages, self.variables)[item]
 
-    def __getitem__(self, item):
-        return self.data[item]
\ No newline at end of file
+    def __iter__(self) -> Iterator[FeatureCounts]:
+        return iter((self.languages, self.variables))
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from model import constants
+
+LANGUAGE = 0
+VARIABLE = 1
+
+Profile = Tuple[Dict[str, int], Dict[str, int]]
+
+
+class FeatureStore:
+    """
+    Persistent developer profiles accumulated across runs.
+    For every repository it keeps the last mined HEAD and per-author contributions, so a re-run mines only
+    the new commits and adds them to the stored contributions and profiles
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or constants.FEATURE_STORE_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=60)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS repos (url TEXT PRIMARY KEY, head TEXT, mined_at REAL);
+            CREATE TABLE IF NOT EXISTS contributions (url TEXT, author TEXT, kind INTEGER, feature TEXT,
+                                                      count INTEGER, PRIMARY KEY (url, author, kind, feature));
+            CREATE TABLE IF NOT EXISTS profiles (author TEXT, kind INTEGER, feature TEXT, count INTEGER,
+                                                 PRIMARY KEY (author, kind, feature));
+        ''')
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def get_head(self, url: str) -> Optional[str]:
+        """
+        Returns the HEAD commit the repository was last mined at, None if it was never mined
+        """
+        row = self._connection.execute('SELECT head FROM repos WHERE url = ?', (url,)).fetchone()
+        return row[0] if row is not None else None
+
+    def apply(self, url: str, head: str, developers: Dict[str, Profile]) -> None:
+        """
+        Adds contributions of newly mined commits to the repository and to the developer profiles
+        :param url: url of the repository
+        :param head: HEAD commit the repository was mined at
+        :param developers: dict with author key and (languages, variables) counts of the new commits value
+        """
+        rows = [(author, kind, feature, count)
+                for author, profile in developers.items()
+                for kind in (LANGUAGE, VARIABLE)
+                for feature, count in profile[kind].items()]
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO contributions VALUES (?, ?, ?, ?, ?) ON CONFLICT (url, author, kind, feature) '
+                'DO UPDATE SET count = count + excluded.count', [(url, *row) for row in rows])
+            self._connection.executemany(
+                'INSERT INTO profiles VALUES (?, ?, ?, ?) ON CONFLICT (author, kind, feature) '
+                'DO UPDATE SET count = count + excluded.count', rows)
+            self._connection.execute('INSERT OR REPLACE INTO repos VALUES (?, ?, ?)', (url, head, time.time()))
+
+    @staticmethod
+    def _group(rows: Iterable[Tuple[str, int, str, int]]) -> Dict[str, Profile]:
+        profiles = defaultdict(lambda: (dict(), dict()))
+        for author, kind, feature, count in rows:
+            profiles[author][kind][feature] = count
+        return dict(profiles)
+
+    def repo_developers(self, url: str) -> Dict[str, Profile]:
+        """
+        Returns contributions of every author to the repository
+        """
+        return self._group(self._connection.execute(
+            'SELECT author, kind, feature, count FROM contributions WHERE url = ?', (url,)))
+
+    def load_profiles(self, authors: Iterable[str] = None) -> Dict[str, Profile]:
+        """
+        Returns accumulated profiles
+        :param authors: authors to load, all of them if None
+        :return: dict with author key and (languages, variables) counts value
+        """
+        if authors is None:
+            return self._group(self._connection.execute('SELECT author, kind, feature, count FROM profiles'))
+        self._connection.execute('CREATE TEMP TABLE IF NOT EXISTS wanted_authors (author TEXT PRIMARY KEY)')
+        with self._connection:
+            self._connection.execute('DELETE FROM wanted_authors')
+            self._connection.executemany('INSERT OR IGNORE INTO wanted_authors VALUES (?)',
+                                         [(author,) for author in authors])
+        return self._group(self._connection.execute(
+            'SELECT author, kind, feature, count FROM profiles JOIN wanted_authors USING (author)'))
@@ -0,0 +1,86 @@
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+ID_DTYPE = np.int32
+COUNT_DTYPE = np.int32
+
+
+class Vocabulary:
+    """
+    Global string interning table: every language or identifier string is stored once and referred to by id
+    """
+    __slots__ = ('ids', 'strings')
+
+    def __init__(self):
+        self.ids: Dict[str, int] = dict()
+        self.strings: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def intern(self, string: str) -> int:
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def intern_many(self, strings: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.intern(string) for string in strings), dtype=ID_DTYPE)
+
+    def get(self, string: str) -> Optional[int]:
+        return self.ids.get(string)
+
+    def string(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+
+LANGUAGES = Vocabulary()
+IDENTIFIERS = Vocabulary()
+
+
+class FeatureCounts:
+    """
+    Counts of interned features as two parallel arrays: ids sorted ascending and their counts
+    """
+    __slots__ = ('ids', 'counts')
+
+    def __init__(self, ids: np.ndarray = None, counts: np.ndarray = None):
+        self.ids = ids if ids is not None else np.empty(0, dtype=ID_DTYPE)
+        self.counts = counts if counts is not None else np.empty(0, dtype=COUNT_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_ids(cls, ids: np.ndarray, counts: np.ndarray) -> 'FeatureCounts':
+        """
+        Builds counts from unsorted ids, counts of repeated ids are summed
+        """
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        summed = np.bincount(inverse.ravel(), weights=counts, minlength=len(unique_ids))
+        return cls(unique_ids.astype(ID_DTYPE), summed.astype(COUNT_DTYPE))
+
+    @classmethod
+    def from_dict(cls, counts: Mapping[str, int], vocabulary: Vocabulary) -> 'FeatureCounts':
+        if not counts:
+            return cls()
+        return cls.from_ids(vocabulary.intern_many(counts.keys()),
+                            np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+
+    @classmethod
+    def merge(cls, features: Sequence['FeatureCounts']) -> 'FeatureCounts':
+        """
+        Sums several feature counts in one vectorized pass
+        """
+        features = [feature for feature in features if len(feature)]
+        if not features:
+            return cls()
+        if len(features) == 1:
+            return features[0]
+        return cls.from_ids(np.concatenate([feature.ids for feature in features]),
+                            np.concatenate([feature.counts for feature in features]))
+
+    def to_dict(self, vocabulary: Vocabulary) -> Dict[str, int]:
+        return {vocabulary.string(feature_id): int(count) for feature_id, count in zip(self.ids, self.counts)}
@@ -1,91 +1,199 @@
 import asyncio
-import itertools
-from typing import List
+from typing import AsyncIterator, List, Optional
 
 import httpx
 
-from model.constants import HEADERS, STARGAZER_PAGES_NUM, REPOS_PAGES_NUM
+import model.graphql_fetcher as graphql_fetcher
+from model import constants
+from model.github_session import GitHubSession
 
 from model.repository import Repository
 
 
-async def fetch_stargazers_for_page(client: httpx.AsyncClient, url, page):
+async def fetch_stargazers_for_page(session: GitHubSession, url, page):
     """
     For a given page, returns list of stargazer urls
-    :param client:  asyncio client to perform requests from
+    :param session: GitHub session to perform requests from
     :param url: url string with a missing page format
     :param page: page number
     :return: Json with stargazers
     """
-    response = await client.get(url.format(page), headers=HEADERS)
+    response = await fetch_page(session, url.format(page))
+    return response.json() if response is not None else []
 
-    return response.json()
 
+async def fetch_page(session: GitHubSession, url: str) -> Optional[httpx.Response]:
+    """
+    Fetches one page of a paginated resource
+    :param session: GitHub session to perform requests from
+    :param url: url of the page
+    :return: response, None if the request failed
+    """
+    try:
+        return await session.get(url)
+    except httpx.HTTPError as error:
+        print('Something went wrong when fetching ' + url + ': ' + str(error))
+        return None
+
+
+def last_page(response: httpx.Response) -> int:
+    """
+    Number of the last page, read from the rel="last" link of the Link header
+    :param response: response with the first page
+    :return: number of the last page, 1 if the resource has only one page
+    """
+    last = response.links.get('last')
+    if last is None:
+        return 1
+    try:
+        return int(httpx.URL(last['url']).params.get('page', 1))
+    except ValueError:
+        return 1
 
-async def fetch_stargazers_for_repo(url: str, asyncio_client: httpx.AsyncClient = None) -> List[str]:
+
+async def iter_pages(session: GitHubSession, url_template: str, pages_num: int,
+                     failures: List[str] = None) -> AsyncIterator[list]:
+    """
+    Fetches the first page, then all the remaining pages it links to concurrently,
+    and yields pages in the order they arrive. A page that could not be fetched is yielded empty
+    :param session: GitHub session to perform requests from
+    :param url_template: url string with a missing page format
+    :param pages_num: upper bound of page numbers, as STARGAZER_PAGES_NUM: pages 1..pages_num - 1 are fetched
+    :param failures: list to append urls of the pages that could not be fetched to
+    :return: async iterator over json lists of the pages
+    """
+    if pages_num <= 1:
+        return
+    first = await fetch_page(session, url_template.format(1))
+    if first is None:
+        if failures is not None:
+            failures.append(url_template.format(1))
+        return
+    yield first.json()
+
+    semaphore = asyncio.Semaphore(constants.PAGES_CONCURRENCY)
+
+    async def fetch(page: int) -> list:
+        async with semaphore:
+            response = await fetch_page(session, url_template.format(page))
+        if response is None:
+            if failures is not None:
+                failures.append(url_template.format(page))
+            return []
+        return response.json()
+
+    tasks = [asyncio.ensure_future(fetch(page)) for page in range(2, min(last_page(first), pages_num - 1) + 1)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fetch_stargazers_for_repo(url: str, session: GitHubSession = None) -> List[str]:
     """
     For a given repository url, returns list of stargazer urls
-    :param asyncio_client: asyncio client to perform requests from
+    :param session: GitHub session to perform requests from
     :param url: url of the repository
     :return: list of stargazer urls
     """
     stargazers = set()
-    tasks = []
-
-    org, name = url.split('/')[-2:]
-    url = f"https://api.github.com/repos/{org}/{name}"
-    url += "/stargazers?page={}&per_page=100"
 
-    if asyncio_client is None:
-        client = httpx.AsyncClient(timeout=None)
+    if session is None:
+        github_session = GitHubSession()
     else:
-        client = asyncio_client
-    for page in range(1, STARGAZER_PAGES_NUM):
-
-        tasks.append(
-            fetch_stargazers_for_page(client, url, page))
+        github_session = session
 
-    response = await asyncio.gather(*tasks)
+    async for page in iter_stargazers(url, github_session):
+        stargazers.update(page)
 
-    if asyncio_client is None:
-        await client.aclose()
-
-    for user_json in response:
-        stargazers.update(list(map(lambda user: 'https://github.com/' + user["login"], user_json)))
+    if session is None:
+        await github_session.aclose()
 
     return list(stargazers)
 
 
 async def fetch_all_repos_for_developer(page_url_template: str, developer_id: str,
-                                        asyncio_client: httpx.AsyncClient = None) -> List[Repository]:
+                                        session: GitHubSession = None) -> List[Repository]:
     """
     For a given developer id, returns all repositories urls
     :param page_url_template: a string template with developer id missing
-    :param asyncio_client: asyncio client to perform requests from
+    :param session: GitHub session to perform requests from
     :param developer_id: id of a developer
     :return: list of repositories
     """
     repo_url_feature = "html_url"
     starred_repos = list()
-    response = await asyncio.gather(
-        *map(fetch_repos, itertools.repeat(asyncio_client), itertools.repeat(page_url_template),
-             itertools.repeat(developer_id),
-             list(range(1, REPOS_PAGES_NUM)))
 
-    )
-    for repo_json in response[0]:
-        starred_repos.append(Repository(repo_json[repo_url_feature]))
+    if session is None:
+        github_session = GitHubSession()
+    else:
+        github_session = session
+
+    if constants.FETCH_BACKEND == 'graphql':
+        repo_urls = await graphql_fetcher.fetch_starred_repos(developer_id, github_session,
+                                                             constants.REPOS_PAGES_NUM - 1)
+        if session is None:
+            await github_session.aclose()
+        return [Repository(repo_url) for repo_url in repo_urls]
+
+    async for page in iter_pages(github_session, page_url_template.replace('{}', developer_id, 1),
+                                 constants.REPOS_PAGES_NUM):
+        for repo_json in page:
+            starred_repos.append(Repository(repo_json[repo_url_feature]))
+
+    if session is None:
+        await github_session.aclose()
 
     return starred_repos
 
 
-async def fetch_repos(client: httpx.AsyncClient, page_url_template: str, developer_id: str, page: int):
+async def fetch_repos(session: GitHubSession, page_url_template: str, developer_id: str, page: int):
     """
     For a given developer id and page number, get json with all repositories
-    :param client: asyncio client to perform requests from
+    :param session: GitHub session to perform requests from
     :param page_url_template: a template for a page with missing developer id and page number
     :param developer_id: id of developer
     :param page: page number
     """
-    response = await client.get(page_url_template.format(developer_id, page), headers=HEADERS)
-    return response.json()
+    url = page_url_template.format(developer_id, page)
+    response = await fetch_page(session, url)
+    return response.json() if response is not None else []
+
+
+async def iter_stargazers(url: str, session: GitHubSession, failures: List[str] = None) -> AsyncIterator[List[str]]:
+    """
+    For a given repository url, yields pages of stargazer urls as soon as each page arrives
+    :param url: url of the repository
+    :param session: GitHub session to perform requests from
+    :param failures: list to append what could not be fetched to, empty afterwards if every page was fetched
+    :return: async iterator over pages of stargazer urls
+    """
+    if constants.FETCH_BACKEND == 'graphql':
+        yield await graphql_fetcher.fetch_stargazers(url, session, constants.STARGAZER_PAGES_NUM - 1, failures)
+        return
+
+    org, name = url.split('/')[-2:]
+    url = f"https://api.github.com/repos/{org}/{name}/stargazers?page={{}}&per_page=100"
+    async for page in iter_pages(session, url, constants.STARGAZER_PAGES_NUM, failures):
+        yield ['https://github.com/' + user["login"] for user in page]
+
+
+async def iter_starred_repos(developer_id: str, session: GitHubSession,
+                             failures: List[str] = None) -> AsyncIterator[List[str]]:
+    """
+    For a given developer id, yields pages of starred repositories urls as soon as each page arrives
+    :param developer_id: id of a developer
+    :param session: GitHub session to perform requests from
+    :param failures: list to append what could not be fetched to, empty afterwards if every page was fetched
+    :return: async iterator over pages of repository urls
+    """
+    if constants.FETCH_BACKEND == 'graphql':
+        yield await graphql_fetcher.fetch_starred_repos(developer_id, session, constants.REPOS_PAGES_NUM - 1,
+                                                        failures)
+        return
+
+    url = f"https://api.github.com/users/{developer_id}/starred?page={{}}&per_page=100"
+    async for page in iter_pages(session, url, constants.REPOS_PAGES_NUM, failures):
+        yield [repo_json["html_url"] for repo_json in page]
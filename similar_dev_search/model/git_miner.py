@@ -0,0 +1,214 @@
+import itertools
+import re
+import subprocess
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+NULL_SHA = '0' * 40
+COMMIT_MARKER = '\x01'
+BLOB_SKIP_CHUNK = 64 * 1024
+HUNK_HEADER = re.compile(r'^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class FileChange(NamedTuple):
+    path: str
+    added_lines: int
+    deleted_lines: int
+    old_blob: str
+    new_blob: str
+    # (first line, number of lines) of the added hunks in the new blob, filled only if hunks are requested
+    added_hunks: Tuple[Tuple[int, int], ...] = ()
+
+    @property
+    def is_deleted(self) -> bool:
+        return self.new_blob == NULL_SHA
+
+    @property
+    def is_added(self) -> bool:
+        return self.old_blob == NULL_SHA
+
+
+class CommitInfo(NamedTuple):
+    sha: str
+    author_email: str
+    files: List[FileChange]
+
+
+def _git(repo_path: str, *args: str) -> List[str]:
+    return ['git', '-C', repo_path, '-c', 'core.quotepath=off', *args]
+
+
+def _parse_hunks(lines: List[str]) -> Dict[str, Tuple[Tuple[int, int], ...]]:
+    """
+    Parses added line ranges from a --unified=0 patch
+    """
+    hunks = dict()
+    path = None
+    skip = 0
+    for line in lines:
+        if skip:
+            # hunk bodies are skipped by count, so their lines are never mistaken for headers
+            skip -= 1
+            continue
+        if line.startswith('+++ '):
+            path = line[6:] if line.startswith('+++ b/') else None
+            if path is not None:
+                hunks[path] = []
+            continue
+        match = HUNK_HEADER.match(line)
+        if match is not None:
+            deleted = int(match.group(1)) if match.group(1) is not None else 1
+            start = int(match.group(2))
+            added = int(match.group(3)) if match.group(3) is not None else 1
+            skip = deleted + added
+            if path is not None and added:
+                hunks[path].append((start, added))
+    return {path: tuple(ranges) for path, ranges in hunks.items()}
+
+
+def _parse_commit(sha: str, author_email: str, lines: List[str]) -> CommitInfo:
+    blobs = dict()
+    stats = dict()
+    hunks = dict()
+    for i, line in enumerate(lines):
+        if line.startswith('diff --git '):
+            hunks = _parse_hunks(lines[i:])
+            break
+        if line.startswith(':'):
+            meta, path = line.split('\t', 1)
+            _, _, old_blob, new_blob, _ = meta.split(' ')
+            blobs[path] = (old_blob, new_blob)
+        elif line:
+            added, deleted, path = line.split('\t', 2)
+            # binary files have '-' instead of line counts
+            stats[path] = (int(added) if added != '-' else 0, int(deleted) if deleted != '-' else 0)
+    files = [FileChange(path, *stats.get(path, (0, 0)), old_blob, new_blob, hunks.get(path, ()))
+             for path, (old_blob, new_blob) in blobs.items()]
+    return CommitInfo(sha, author_email, files)
+
+
+def shallow_commits(repo_path: str) -> Set[str]:
+    """
+    Returns the boundary commits of a shallow clone, whose parents are missing
+    """
+    shallow_path = subprocess.run(_git(repo_path, 'rev-parse', '--path-format=absolute', '--git-path', 'shallow'),
+                                  capture_output=True, check=True, encoding='utf-8').stdout.strip()
+    try:
+        with open(shallow_path) as shallow_file:
+            return {line.strip() for line in shallow_file if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def iter_commits(repo_path: str, limit: Optional[int] = None, revision_range: str = 'HEAD',
+                 with_hunks: bool = False) -> Iterator[CommitInfo]:
+    """
+    Streams commits from newest to oldest with per-file line stats and blob ids, read from a single `git log` pass.
+    Stops reading (and kills git) as soon as the consumer stops iterating.
+    Boundary commits of a shallow clone are skipped: git diffs them against the empty tree,
+    which would credit their author with every file of the repository
+    :param repo_path: path to the repository
+    :param limit: maximal number of commits
+    :param revision_range: revisions to walk, e.g. 'HEAD' or 'old_sha..HEAD'
+    :param with_hunks: whether to also read line ranges of the added hunks from a zero-context patch
+    :return: iterator over commits
+    """
+    args = ['log', '--no-renames', '--raw', '--numstat', '--no-abbrev', '--no-merges',
+            f'--format={COMMIT_MARKER}%H%x00%ae']
+    if with_hunks:
+        args += ['--patch', '--unified=0', '--no-color', '--no-ext-diff']
+    boundary = shallow_commits(repo_path)
+    if limit is not None:
+        args.append(f'--max-count={limit + len(boundary)}')
+    args += [revision_range, '--']
+
+    process = subprocess.Popen(_git(repo_path, *args), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               encoding='utf-8', errors='surrogateescape')
+    try:
+        header = None
+        lines = []
+        yielded = 0
+        for line in itertools.chain(process.stdout, [COMMIT_MARKER]):
+            line = line.rstrip('\n')
+            if not line.startswith(COMMIT_MARKER):
+                lines.append(line)
+                continue
+            if header is not None and header[0] not in boundary:
+                yield _parse_commit(*header, lines)
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+            header = line[1:].split('\x00', 1)
+            lines = []
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, 'git log')
+    finally:
+        process.kill()
+        process.wait()
+
+
+class BlobReader:
+    """
+    Reads blob contents through one persistent `git cat-file --batch` process
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+        self._process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> 'BlobReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is None:
+            self._process = subprocess.Popen(_git(self.repo_path, 'cat-file', '--batch'), stdin=subprocess.PIPE,
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return self._process
+
+    def read(self, sha: str, limit: Optional[int] = None) -> Optional[bytes]:
+        """
+        Returns contents of the blob, None if it is missing
+        :param sha: blob id
+        :param limit: maximum number of bytes returned, the rest of the blob is skipped
+        :return: blob contents
+        """
+        if sha == NULL_SHA:
+            return None
+        process = self._start()
+        process.stdin.write(sha.encode() + b'\n')
+        process.stdin.flush()
+        header = process.stdout.readline().split()
+        if len(header) != 3:
+            return None
+        size = int(header[2])
+        content = process.stdout.read(size if limit is None else min(size, limit))
+        remaining = size - len(content)
+        while remaining > 0:
+            remaining -= len(process.stdout.read(min(remaining, BLOB_SKIP_CHUNK)))
+        process.stdout.read(1)
+        return content
+
+    def close(self) -> None:
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+
+def head_sha(repo_path: str) -> str:
+    """
+    Returns id of the HEAD commit
+    """
+    return subprocess.run(_git(repo_path, 'rev-parse', 'HEAD'), capture_output=True, check=True,
+                          encoding='utf-8').stdout.strip()
+
+
+def is_ancestor(repo_path: str, sha: str, descendant: str = 'HEAD') -> bool:
+    """
+    Whether the commit is reachable from the descendant in the (possibly shallow) clone. A commit left in the object
+    database by a previous, deeper fetch is not reachable once it is behind the shallow boundary
+    """
+    return subprocess.run(_git(repo_path, 'merge-base', '--is-ancestor', sha, descendant),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
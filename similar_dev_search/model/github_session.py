@@ -0,0 +1,204 @@
+import asyncio
+import random
+import time
+from typing import List, Optional
+
+import httpx
+
+from model import constants
+from model.http_cache import CacheEntry, ResponseCache, cache_lookup, cached_get, get_default_cache
+from model.metrics import metrics
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+def graphql_errors(response: httpx.Response) -> List[dict]:
+    """
+    Errors of a GraphQL response: GraphQL reports them, rate limiting included, with a 200 status
+    :param response: response to a GraphQL query
+    :return: list of errors, empty if the query succeeded
+    """
+    if response.request.method != 'POST' or response.status_code != 200:
+        return []
+    try:
+        return response.json().get('errors') or []
+    except ValueError:
+        return []
+
+
+class TokenState:
+    """
+    Rate limit budget of one GitHub token, as reported by the X-RateLimit-* headers
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.remaining = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def available_at(self) -> float:
+        if self.remaining == 0:
+            return max(self.reset_at, self.blocked_until)
+        return self.blocked_until
+
+    def update(self, response: httpx.Response) -> None:
+        headers = response.headers
+        if 'x-ratelimit-remaining' in headers:
+            self.remaining = int(headers['x-ratelimit-remaining'])
+        if 'x-ratelimit-reset' in headers:
+            self.reset_at = float(headers['x-ratelimit-reset'])
+        if 'retry-after' in headers:
+            self.blocked_until = time.time() + float(headers['retry-after'])
+
+
+class GitHubSession:
+    """
+    Shared keep-alive client for the GitHub API: limits the number of requests in flight,
+    rotates tokens, waits for rate limit resets and retries failed requests with exponential backoff
+    """
+
+    def __init__(self, tokens: List[str] = None, concurrency: int = None, max_retries: int = None,
+                 cache: ResponseCache = None, transport: httpx.AsyncBaseTransport = None):
+        tokens = tokens or constants.TOKENS or [constants.HEADERS['Authorization'].removeprefix('token ')]
+        self.tokens = [TokenState(token) for token in tokens]
+        self.concurrency = concurrency or constants.MAX_CONCURRENT_REQUESTS
+        self.max_retries = max_retries if max_retries is not None else constants.MAX_RETRIES
+        self.cache = cache if cache is not None else get_default_cache()
+        self.client = httpx.AsyncClient(
+            timeout=constants.REQUEST_TIMEOUT_SECONDS, transport=transport,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._next_token = 0
+
+    async def __aenter__(self) -> 'GitHubSession':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+        await asyncio.to_thread(self.cache.flush)
+
+    async def _acquire_token(self) -> TokenState:
+        """
+        Picks the next token in round-robin order that has budget left, sleeps until a reset if none has
+        :return: token to send the request with
+        """
+        while True:
+            now = time.time()
+            for offset in range(len(self.tokens)):
+                state = self.tokens[(self._next_token + offset) % len(self.tokens)]
+                if state.available_at() <= now:
+                    self._next_token = (self._next_token + offset + 1) % len(self.tokens)
+                    if state.remaining is not None:
+                        state.remaining = max(state.remaining - 1, 0)
+                    return state
+            wait = min(state.available_at() for state in self.tokens) - now
+            print(f'All tokens are rate limited, waiting {wait:.0f}s')
+            metrics.inc('api_rate_limit_wait_seconds', max(wait, 1.0))
+            await asyncio.sleep(max(wait, 1.0))
+
+    def _headers(self, state: TokenState) -> dict:
+        headers = dict(constants.HEADERS)
+        headers['Authorization'] = 'token ' + state.token
+        return headers
+
+    @staticmethod
+    def _is_rate_limited(response: httpx.Response) -> bool:
+        if response.status_code == 429:
+            return True
+        if response.status_code == 403:
+            return response.headers.get('x-ratelimit-remaining') == '0' or 'retry-after' in response.headers \
+                or GitHubSession._is_secondary_rate_limit(response)
+        return any(error.get('type') == 'RATE_LIMITED' for error in graphql_errors(response))
+
+    @staticmethod
+    def _is_secondary_rate_limit(response: httpx.Response) -> bool:
+        # secondary limits are reported in the body only, without the rate limit headers
+        return response.status_code == 403 and 'secondary rate limit' in response.text.lower()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(constants.RETRY_BACKOFF_SECONDS * 2 ** attempt, constants.MAX_RETRY_BACKOFF_SECONDS)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _rate_limit_backoff(self, response: httpx.Response, attempt: int) -> float:
+        if self._is_secondary_rate_limit(response):
+            return constants.SECONDARY_RATE_LIMIT_BACKOFF_SECONDS * 2 ** attempt
+        return self._backoff(attempt)
+
+    async def _send(self, method: str, url: str, state: TokenState, payload: dict = None,
+                    entry: Optional[CacheEntry] = None) -> httpx.Response:
+        if method == 'GET':
+            return await cached_get(self.client, url, self._headers(state), self.cache, entry)
+        return await self.client.request(method, url, headers=self._headers(state), json=payload)
+
+    async def request(self, method: str, url: str, payload: dict = None) -> httpx.Response:
+        """
+        Request to the GitHub API. GET requests go through the response cache: fresh entries are served
+        before a token is acquired, so they neither spend nor wait for a rate limit budget
+        :param method: http method
+        :param url: requested url
+        :param payload: json body of the request
+        :return: successful response
+        :raises httpx.HTTPStatusError: if the request still fails after all retries
+        """
+        response: Optional[httpx.Response] = None
+        entry = None
+        if method == 'GET':
+            response, entry = await cache_lookup(url, self.cache)
+            if response is not None:
+                return response
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                state = await self._acquire_token()
+                start = time.perf_counter()
+                try:
+                    response = await self._send(method, url, state, payload, entry)
+                except httpx.TransportError as error:
+                    metrics.inc('api_requests', method=method, status='error')
+                    if attempt == self.max_retries:
+                        raise
+                    print(f'Request to {url} failed: {error!r}, retrying')
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+
+                state.update(response)
+                self._record(method, response, time.perf_counter() - start)
+                if self._is_rate_limited(response):
+                    metrics.inc('api_rate_limited')
+                    if 'retry-after' not in response.headers and state.remaining != 0:
+                        state.blocked_until = time.time() + self._rate_limit_backoff(response, attempt)
+                    continue
+                if response.status_code in RETRY_STATUSES:
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                break
+
+        response.raise_for_status()
+        return response
+
+    def _record(self, method: str, response: httpx.Response, seconds: float) -> None:
+        metrics.inc('api_requests', method=method, status=response.status_code)
+        metrics.observe('api_request_seconds', seconds, method=method)
+        budgets = [state.remaining for state in self.tokens if state.remaining is not None]
+        if budgets:
+            metrics.set_gauge('api_rate_limit_remaining', sum(budgets))
+
+    async def get(self, url: str) -> httpx.Response:
+        """
+        GET request to the GitHub API
+        :param url: requested url
+        :return: successful response
+        """
+        return await self.request('GET', url)
+
+    async def post(self, url: str, payload: dict) -> httpx.Response:
+        """
+        POST request to the GitHub API
+        :param url: requested url
+        :param payload: json body of the request
+        :return: successful response
+        """
+        return await self.request('POST', url, payload)
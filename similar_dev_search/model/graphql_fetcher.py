@@ -0,0 +1,172 @@
+import asyncio
+import json
+import weakref
+from typing import Callable, List, NamedTuple, Optional
+
+import httpx
+
+from model import constants
+from model.github_session import GitHubSession, graphql_errors
+
+STARGAZERS_FIELD = ('repository(owner: {owner}, name: {name}) {{ stargazers(first: 100{after}) '
+                    '{{ pageInfo {{ hasNextPage endCursor }} nodes {{ login }} }} }}')
+STARRED_FIELD = ('user(login: {login}) {{ starredRepositories(first: 100{after}, '
+                 'orderBy: {{field: STARRED_AT, direction: DESC}}) '
+                 '{{ pageInfo {{ hasNextPage endCursor }} nodes {{ url }} }} }}')
+
+
+class Page(NamedTuple):
+    items: List[str]
+    cursor: Optional[str]
+    has_next: bool
+    failed: bool = False
+
+
+EMPTY_PAGE = Page([], None, False)
+FAILED_PAGE = Page([], None, False, failed=True)
+
+
+def _after(cursor: Optional[str]) -> str:
+    return '' if cursor is None else ', after: ' + json.dumps(cursor)
+
+
+def _stargazers_field(url: str, cursor: Optional[str]) -> str:
+    owner, name = url.rstrip('/').split('/')[-2:]
+    return STARGAZERS_FIELD.format(owner=json.dumps(owner), name=json.dumps(name), after=_after(cursor))
+
+
+def _stargazers_page(node: Optional[dict]) -> Page:
+    if not node:
+        return EMPTY_PAGE
+    connection = node['stargazers']
+    return Page(['https://github.com/' + user['login'] for user in connection['nodes']],
+                connection['pageInfo']['endCursor'], connection['pageInfo']['hasNextPage'])
+
+
+def _starred_field(login: str, cursor: Optional[str]) -> str:
+    return STARRED_FIELD.format(login=json.dumps(login), after=_after(cursor))
+
+
+def _starred_page(node: Optional[dict]) -> Page:
+    if not node:
+        return EMPTY_PAGE
+    connection = node['starredRepositories']
+    return Page([repo['url'] for repo in connection['nodes']],
+                connection['pageInfo']['endCursor'], connection['pageInfo']['hasNextPage'])
+
+
+class PageBatcher:
+    """
+    Coalesces concurrent single-page requests into GraphQL queries with up to GRAPHQL_BATCH_SIZE aliased fields,
+    so callers fetch one repository or user at a time while requests go out in batches
+    """
+
+    def __init__(self, session: GitHubSession, build_field: Callable[[str, Optional[str]], str],
+                 parse_page: Callable[[Optional[dict]], Page]):
+        self.session = session
+        self.build_field = build_field
+        self.parse_page = parse_page
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def fetch(self, key: str, cursor: Optional[str] = None) -> Page:
+        """
+        Fetches one page of a connection
+        :param key: repository url or user login
+        :param cursor: cursor to continue from, None for the first page
+        :return: page of items
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((key, cursor, future))
+        if len(self._pending) >= constants.GRAPHQL_BATCH_SIZE:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(constants.GRAPHQL_BATCH_DELAY_SECONDS, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:constants.GRAPHQL_BATCH_SIZE]
+            self._pending = self._pending[constants.GRAPHQL_BATCH_SIZE:]
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list) -> None:
+        query = '{ ' + ' '.join(f'q{i}: {self.build_field(key, cursor)}'
+                                for i, (key, cursor, _) in enumerate(batch)) + ' }'
+        try:
+            response = await self.session.post(constants.GRAPHQL_URL, {'query': query})
+            data = response.json().get('data') or {}
+            errors = graphql_errors(response)
+        except (httpx.HTTPError, ValueError) as error:
+            print('Something went wrong when running GraphQL query: ' + str(error))
+            data, errors = None, []
+        if errors:
+            print('GraphQL query returned errors: ' + '; '.join(error.get('message', '') for error in errors))
+            if not data:
+                data = None
+        # a field that failed is null like the field of a missing repository or user, but its pages are not empty
+        failed = {error['path'][0] for error in errors if error.get('path') and error.get('type') != 'NOT_FOUND'}
+        for i, (_, _, future) in enumerate(batch):
+            if not future.done():
+                alias = f'q{i}'
+                future.set_result(FAILED_PAGE if data is None or alias in failed else self.parse_page(data.get(alias)))
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+def _get_batcher(session: GitHubSession, kind: str) -> PageBatcher:
+    session_batchers = _batchers.setdefault(session, dict())
+    if kind not in session_batchers:
+        if kind == 'stargazers':
+            session_batchers[kind] = PageBatcher(session, _stargazers_field, _stargazers_page)
+        else:
+            session_batchers[kind] = PageBatcher(session, _starred_field, _starred_page)
+    return session_batchers[kind]
+
+
+async def _fetch_pages(batcher: PageBatcher, key: str, pages_num: int, failures: List[str] = None) -> List[str]:
+    items = []
+    cursor = None
+    for _ in range(pages_num):
+        page = await batcher.fetch(key, cursor)
+        if page.failed and failures is not None:
+            failures.append(key)
+        items.extend(page.items)
+        if not page.has_next:
+            break
+        cursor = page.cursor
+    return items
+
+
+async def fetch_stargazers(url: str, session: GitHubSession, pages_num: int,
+                           failures: List[str] = None) -> List[str]:
+    """
+    For a given repository url, returns stargazer urls using batched GraphQL queries
+    :param url: url of the repository
+    :param session: GitHub session to perform requests from
+    :param pages_num: maximal number of pages of 100 stargazers
+    :param failures: list to append the url to if a page could not be fetched
+    :return: list of stargazer urls
+    """
+    return await _fetch_pages(_get_batcher(session, 'stargazers'), url, pages_num, failures)
+
+
+async def fetch_starred_repos(developer_id: str, session: GitHubSession, pages_num: int,
+                              failures: List[str] = None) -> List[str]:
+    """
+    For a given developer id, returns urls of starred repositories using batched GraphQL queries
+    :param developer_id: id of a developer
+    :param session: GitHub session to perform requests from
+    :param pages_num: maximal number of pages of 100 repositories
+    :param failures: list to append the developer id to if a page could not be fetched
+    :return: list of repository urls
+    """
+    return await _fetch_pages(_get_batcher(session, 'starred'), developer_id, pages_num, failures)
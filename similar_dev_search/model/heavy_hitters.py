@@ -0,0 +1,74 @@
+import heapq
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from model import constants
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters: approximate counts of the most frequent items of a stream in bounded memory.
+    At most `capacity` items are monitored; a new item replaces one with the minimal count and inherits it
+    as an overestimation error. Every item seen more than n / capacity times out of n is guaranteed
+    to be monitored, and the counts are exact while fewer than `capacity` distinct items have been seen
+    """
+
+    def __init__(self, capacity: int = None):
+        self.capacity = capacity or constants.TOP_REPOS_CAPACITY
+        self.counts: Dict[Hashable, int] = dict()
+        self.errors: Dict[Hashable, int] = dict()
+        # items by count, dicts are used as insertion-ordered sets
+        self._buckets: Dict[int, Dict[Hashable, None]] = dict()
+        self._min_count = 0
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self.counts
+
+    def __getitem__(self, item: Hashable) -> int:
+        return self.counts.get(item, 0)
+
+    def _move(self, item: Hashable, count: int, new_count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min_count:
+                # counts only grow by one, so the item's new bucket is the next smallest one
+                self._min_count = new_count
+        self._buckets.setdefault(new_count, dict())[item] = None
+        self.counts[item] = new_count
+
+    def add(self, item: Hashable) -> None:
+        """
+        Counts one occurrence of the item
+        """
+        count = self.counts.get(item)
+        if count is not None:
+            self._move(item, count, count + 1)
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.errors[item] = 0
+            self._buckets.setdefault(1, dict())[item] = None
+            self._min_count = 1
+        else:
+            # the oldest item with the minimal count is replaced
+            evicted = next(iter(self._buckets[self._min_count]))
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[item] = self._min_count
+            self.errors[item] = self._min_count
+            self._buckets[self._min_count][item] = None
+            del self._buckets[self._min_count][evicted]
+            self._move(item, self._min_count, self._min_count + 1)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """
+        Monitored items with the largest counts, like Counter.most_common
+        :param n: number of items to return, all monitored items if None
+        :return: list of items with their (over)estimated counts, most frequent first
+        """
+        if n is None:
+            return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import httpx
+
+from model import constants
+from model.metrics import metrics
+
+CACHED_HEADERS = ('etag', 'last-modified', 'link', 'content-type')
+# access times are written in batches, a write transaction per cache hit would serialize readers of other processes
+ACCESS_BATCH_SIZE = 100
+
+
+class CacheEntry(NamedTuple):
+    headers: Dict[str, str]
+    body: bytes
+    fetched_at: float
+
+
+class ResponseCache:
+    """
+    Persistent cache of GitHub API responses, keyed by url.
+    Fresh entries are served without a request, stale ones are revalidated with a conditional request.
+    Methods are blocking and thread-safe, the event loop calls them in threads
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_entries: int = None):
+        self.path = path or constants.HTTP_CACHE_PATH
+        self.ttl = ttl if ttl is not None else constants.HTTP_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or constants.HTTP_CACHE_MAX_ENTRIES
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, '
+                                 'headers TEXT, body BLOB, fetched_at REAL, accessed_at REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self._connection.commit()
+        self._lock = threading.Lock()
+        self._accessed: Dict[str, float] = dict()
+        self._writes = 0
+
+    @staticmethod
+    def key(url: str) -> str:
+        """
+        Returns cache key: public API responses do not depend on the token, and tokens are rotated,
+        so the key does not depend on the token either
+        :param url: requested url
+        :return: hex digest
+        """
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl
+
+    def _write_accessed(self) -> None:
+        # the caller holds the lock and commits
+        self._connection.executemany('UPDATE responses SET accessed_at = ? WHERE key = ?',
+                                     [(accessed_at, key) for key, accessed_at in self._accessed.items()])
+        self._accessed.clear()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._connection.execute('SELECT headers, body, fetched_at FROM responses WHERE key = ?',
+                                           (key,)).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= ACCESS_BATCH_SIZE:
+                with self._connection:
+                    self._write_accessed()
+        return CacheEntry(json.loads(row[0]), row[1], row[2])
+
+    def put(self, key: str, url: str, response: httpx.Response) -> None:
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        now = time.time()
+        with self._lock, self._connection:
+            self._accessed.pop(key, None)
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key, url, json.dumps(headers), response.content, now, now))
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._evict()
+
+    def refresh(self, key: str) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._accessed.pop(key, None)
+            self._connection.execute('UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?',
+                                     (now, now, key))
+
+    def _evict(self) -> None:
+        self._write_accessed()
+        self._connection.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+                                 'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def evict(self) -> None:
+        """
+        Removes least recently accessed entries above max_entries
+        """
+        with self._lock, self._connection:
+            self._evict()
+
+    def flush(self) -> None:
+        """
+        Writes the pending access times
+        """
+        with self._lock, self._connection:
+            self._write_accessed()
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_default_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+def _to_response(url: str, entry: CacheEntry) -> httpx.Response:
+    return httpx.Response(200, headers=entry.headers, content=entry.body, request=httpx.Request('GET', url))
+
+
+async def cache_lookup(url: str, cache: ResponseCache = None) \
+        -> Tuple[Optional[httpx.Response], Optional[CacheEntry]]:
+    """
+    Looks the url up in the response cache, without any request, so a fresh entry costs no rate limit budget
+    :param url: requested url
+    :param cache: response cache, the default one if not given
+    :return: response restored from a fresh entry, or None and the stale entry to revalidate, if any
+    """
+    cache = cache if cache is not None else get_default_cache()
+    entry = await asyncio.to_thread(cache.get, cache.key(url))
+    if entry is not None and cache.is_fresh(entry):
+        metrics.inc('http_cache_requests', result='hit')
+        return _to_response(url, entry), entry
+    return None, entry
+
+
+async def cached_get(client: httpx.AsyncClient, url: str, headers: Dict[str, str], cache: ResponseCache = None,
+                     entry: Optional[CacheEntry] = None) -> httpx.Response:
+    """
+    GET request that revalidates a stale cache entry and stores the response.
+    304 responses are not counted against the GitHub rate limit
+    :param client: asyncio client to perform requests from
+    :param url: requested url
+    :param headers: request headers
+    :param cache: response cache, the default one if not given
+    :param entry: stale entry of the url returned by cache_lookup, None if the url is not cached
+    :return: response, possibly restored from the cache
+    """
+    cache = cache if cache is not None else get_default_cache()
+    key = cache.key(url)
+    request_headers = dict(headers)
+    if entry is not None:
+        if 'etag' in entry.headers:
+            request_headers['If-None-Match'] = entry.headers['etag']
+        if 'last-modified' in entry.headers:
+            request_headers['If-Modified-Since'] = entry.headers['last-modified']
+
+    response = await client.get(url, headers=request_headers)
+    if response.status_code == 304 and entry is not None:
+        metrics.inc('http_cache_requests', result='revalidated')
+        await asyncio.to_thread(cache.refresh, key)
+        return _to_response(url, entry)
+    metrics.inc('http_cache_requests', result='miss')
+    if response.status_code == 200:
+        await asyncio.to_thread(cache.put, key, url, response)
+    return response
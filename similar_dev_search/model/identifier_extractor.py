@@ -0,0 +1,75 @@
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, Optional, Sequence, Tuple
+
+from pygments.lexer import Lexer
+from pygments.lexers import find_lexer_class, get_lexer_by_name
+from pygments.token import Name
+from pygments.util import ClassNotFound
+
+# names that are not chosen by the developer
+IGNORED_NAMES = (Name.Builtin, Name.Tag, Name.Entity, Name.Label, Name.Decorator)
+
+# one lexer instance per language and process, None if pygments does not know the language
+_lexers: Dict[str, Optional[Lexer]] = dict()
+
+
+def get_lexer(language: str) -> Optional[Lexer]:
+    """
+    Returns a cached lexer for the language
+    :param language: language name as detected by enry
+    :return: lexer, None if the language is not supported by pygments
+    """
+    if language not in _lexers:
+        lexer_class = find_lexer_class(language)
+        try:
+            lexer = lexer_class(stripnl=False, ensurenl=False) if lexer_class is not None else \
+                get_lexer_by_name(language.lower(), stripnl=False, ensurenl=False)
+        except ClassNotFound:
+            lexer = None
+        _lexers[language] = lexer
+    return _lexers[language]
+
+
+def _is_identifier(token_type) -> bool:
+    return token_type in Name and not any(token_type in ignored for ignored in IGNORED_NAMES)
+
+
+def extract_identifiers(language: str, source_code: bytes,
+                        hunks: Optional[Sequence[Tuple[int, int]]] = None) -> Dict[str, int]:
+    """
+    Counts identifiers in the source code, tokenized with the pygments lexer of the language
+    :param language: language of the source code
+    :param source_code: contents of the file
+    :param hunks: (first line, number of lines) ranges to count identifiers in, the whole file if None
+    :return: dict with identifier key and number of occurrences value
+    """
+    lexer = get_lexer(language)
+    if lexer is None or not source_code:
+        return dict()
+    text = source_code.decode('utf-8', errors='replace')
+
+    identifiers = Counter()
+    if hunks is None:
+        for token_type, value in lexer.get_tokens(text):
+            if _is_identifier(token_type):
+                identifiers[value] += 1
+        return dict(identifiers)
+
+    if not hunks:
+        return dict()
+    # the whole file is tokenized to keep the lexer state right, tokens are filtered by their line
+    line_starts = [0]
+    position = text.find('\n')
+    while position != -1:
+        line_starts.append(position + 1)
+        position = text.find('\n', position + 1)
+    hunk_starts = [start for start, _ in hunks]
+    for index, token_type, value in lexer.get_tokens_unprocessed(text):
+        if not _is_identifier(token_type):
+            continue
+        line = bisect_right(line_starts, index)
+        hunk = bisect_right(hunk_starts, line) - 1
+        if hunk >= 0 and line < hunks[hunk][0] + hunks[hunk][1]:
+            identifiers[value] += 1
+    return dict(identifiers)
@@ -1,13 +1,125 @@
 import os
 from collections import defaultdict
-from typing import Tuple
+from typing import Callable, Dict, Optional, Sequence, Tuple
 
 import enry
 import httpx
 
-from model.constants import HEADERS
+from model import constants
+from model.identifier_extractor import extract_identifiers
 from model.languages import ALL_LANGUAGES
 
+SUPPORTED_LANGUAGES = frozenset(ALL_LANGUAGES)
+
+# unambiguous extensions and file names, resolved without calling enry
+EXTENSION_LANGUAGES = {
+    '.py': 'Python', '.java': 'Java', '.kt': 'Kotlin', '.kts': 'Kotlin', '.scala': 'Scala', '.go': 'Go',
+    '.rs': 'Rust', '.rb': 'Ruby', '.js': 'JavaScript', '.mjs': 'JavaScript', '.jsx': 'JavaScript',
+    '.ts': 'TypeScript', '.tsx': 'TSX', '.cs': 'C#', '.cpp': 'C++', '.cc': 'C++', '.cxx': 'C++', '.hpp': 'C++',
+    '.c': 'C', '.swift': 'Swift', '.php': 'PHP', '.dart': 'Dart', '.lua': 'Lua', '.hs': 'Haskell',
+    '.ex': 'Elixir', '.exs': 'Elixir', '.erl': 'Erlang', '.clj': 'Clojure', '.jl': 'Julia', '.sh': 'Shell',
+    '.bash': 'Shell', '.ps1': 'PowerShell', '.groovy': 'Groovy', '.vue': 'Vue', '.html': 'HTML', '.css': 'CSS',
+    '.scss': 'SCSS', '.json': 'JSON', '.yml': 'YAML', '.yaml': 'YAML', '.toml': 'TOML', '.xml': 'XML',
+    '.md': 'Markdown', '.rst': 'reStructuredText', '.txt': 'Text', '.sql': 'SQL', '.proto': 'Protocol Buffer',
+}
+FILENAME_LANGUAGES = {
+    'Makefile': 'Makefile', 'Dockerfile': 'Dockerfile', 'CMakeLists.txt': 'CMake', 'Gemfile': 'Ruby',
+    'Rakefile': 'Ruby', 'BUILD': 'Starlark', 'WORKSPACE': 'Starlark',
+}
+BINARY_EXTENSIONS = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif', '.ico', '.bmp', '.webp', '.pdf', '.zip', '.gz', '.tar', '.jar', '.so',
+    '.dll', '.exe', '.class', '.pyc', '.o', '.a', '.woff', '.woff2', '.ttf', '.otf', '.mp3', '.mp4', '.bin',
+})
+# files generated by tools, recognized by name without reading them
+GENERATED_FILENAMES = frozenset({
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'Cargo.lock', 'poetry.lock', 'Pipfile.lock',
+    'Gemfile.lock', 'composer.lock', 'go.sum',
+})
+GENERATED_SUFFIXES = (
+    '.min.js', '.min.css', '_pb2.py', '_pb2_grpc.py', '.pb.go', '.pb.cc', '.pb.h', '.g.dart', '.designer.cs',
+)
+
+# extension -> language, or None if the extension is ambiguous and the content has to be sniffed
+_extension_cache: Dict[str, Optional[str]] = dict()
+
+
+def _language_by_extension(extension: str, file_name: str) -> Optional[str]:
+    if extension in EXTENSION_LANGUAGES:
+        return EXTENSION_LANGUAGES[extension]
+    if extension not in _extension_cache:
+        lang, safe = enry.get_language_by_extension(file_name)
+        _extension_cache[extension] = lang if safe and lang else None
+    return _extension_cache[extension]
+
+
+def _is_binary(prefix: bytes) -> bool:
+    return b'\x00' in prefix or enry.is_binary(prefix)
+
+
+def _is_generated_name(file_name: str, base_name: str) -> bool:
+    return base_name in GENERATED_FILENAMES or base_name.lower().endswith(GENERATED_SUFFIXES) or \
+        enry.is_generated(file_name, b'')
+
+
+def is_skipped_content(file_name: str, content: bytes) -> bool:
+    """
+    Whether the file is binary or generated judging by a prefix of its contents
+    :param file_name: path of the file in the repository
+    :param content: contents of the file, only the first CONTENT_SNIFF_BYTES are inspected
+    """
+    prefix = content[:constants.CONTENT_SNIFF_BYTES]
+    return _is_binary(prefix) or enry.is_generated(file_name, prefix)
+
+
+def detect_language(file_name: str, read_content: Callable[[], Optional[bytes]] = None) -> str:
+    """
+    Returns language of the file: by file name and extension first, by a bounded prefix of the content
+    only if those are ambiguous. Vendored, generated and binary files are skipped, generated files with known
+    extensions are recognized by name here and by content in get_language_variables
+    :param file_name: path of the file in the repository
+    :param read_content: returns at least the first CONTENT_SNIFF_BYTES of the file, called only if they are needed
+    :return: language, empty string if the file is skipped or not recognized
+    """
+    base_name = os.path.basename(file_name)
+    extension = os.path.splitext(base_name)[1].lower()
+    if extension in BINARY_EXTENSIONS or enry.is_vendor(file_name) or _is_generated_name(file_name, base_name):
+        return ''
+    if base_name in FILENAME_LANGUAGES:
+        return FILENAME_LANGUAGES[base_name]
+
+    lang = _language_by_extension(extension, file_name) if extension else None
+    if lang is not None:
+        return lang
+
+    lang, safe = enry.get_language_by_filename(file_name)
+    if lang and safe:
+        return lang
+
+    content = read_content() if read_content is not None else None
+    if not content:
+        return lang
+    if is_skipped_content(file_name, content):
+        return ''
+    sniffed, _ = enry.get_language_by_content(file_name, content[:constants.CONTENT_SNIFF_BYTES])
+    return sniffed or lang
+
+
+def detect_languages(file_names: Sequence[str], read_content: Callable[[str], Optional[bytes]] = None) \
+        -> Dict[str, str]:
+    """
+    Classifies a batch of files of one repository, each file name is classified once
+    :param file_names: paths of the files in the repository
+    :param read_content: returns at least the first CONTENT_SNIFF_BYTES of a file by its path, called only for
+    ambiguous files
+    :return: dict with file name key and language value
+    """
+    languages = dict()
+    for file_name in file_names:
+        if file_name not in languages:
+            reader = (lambda name=file_name: read_content(name)) if read_content is not None else None
+            languages[file_name] = detect_language(file_name, reader)
+    return languages
+
 
 async def fetch_language_variables(repo_path: str, file_name: str, source_code: bytes = None,
                                    asyncio_client: httpx.AsyncClient = None) -> \
@@ -20,15 +132,33 @@ async def fetch_language_variables(repo_path: str, file_name: str, source_code:
     :param asyncio_client: asyncio client to perform requests from
     :return: language and dict of variables
     """
-    with open(os.path.join(repo_path, file_name)):
-        lang, _ = enry.get_language_by_content(file_name, source_code)
-        if lang == '':
-            lang, _ = enry.get_language_by_filename(file_name)
+    return get_language_variables(file_name, source_code)
+
+
+def get_language_variables(file_name: str, source_code: bytes = None, language: str = None,
+                           hunks: Sequence[Tuple[int, int]] = None) -> Tuple[str, defaultdict[int]]:
+    """
+    Synchronous version of fetch_language_variables, usable in worker processes
+    :param file_name: name of the file
+    :param source_code: source code of the file
+    :param language: language of the file, if it is already detected
+    :param hunks: (first line, number of lines) ranges changed in the file, the whole file if None
+    :return: language and dict of variables, empty language if the contents are binary or generated
+    """
+    lang = language if language is not None else detect_language(file_name, lambda: source_code)
 
-        variables = defaultdict(int)
+    variables = defaultdict(int)
+    if source_code and is_skipped_content(file_name, source_code):
+        return '', variables
 
-    if lang in ALL_LANGUAGES:
-        pass
-        # NOT YET SUPPORTED - added in the next pr
+    if lang in SUPPORTED_LANGUAGES and source_code:
+        variables.update(extract_identifiers(lang, source_code, hunks))
 
     return lang, variables
+
+
+def needs_source_code(language: str) -> bool:
+    """
+    Whether variables are extracted for the language, i.e. whether the file contents have to be read
+    """
+    return language in SUPPORTED_LANGUAGES
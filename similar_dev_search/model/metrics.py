@@ -0,0 +1,156 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+PREFIX = 'similar_dev_search_'
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, object]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and timing summaries of the hot paths, exportable as a JSON report
+    or a Prometheus text file. Updates are thread-safe, since clones run in threads.
+    With a profile directory set, stages are also profiled with cProfile and dumped there
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Key, float] = defaultdict(float)
+        self.gauges: Dict[Key, float] = dict()
+        # count, sum and max of observed durations
+        self.summaries: Dict[Key, list] = dict()
+        self.profile_dir: Optional[str] = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.summaries.clear()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self.counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        with self._lock:
+            summary = self.summaries.setdefault(_key(name, labels), [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += seconds
+            summary[2] = max(summary[2], seconds)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures wall and CPU time of a stage of the run, and profiles it if profiling is on
+        :param name: name of the stage
+        """
+        profiler = None
+        if self.profile_dir is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.inc('stage_wall_seconds', time.perf_counter() - wall_start, stage=name)
+            self.inc('stage_cpu_seconds', time.process_time() - cpu_start, stage=name)
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, name + '.prof'))
+
+    def profile_path(self, name: str) -> Optional[str]:
+        """
+        Path to dump a profile of work done in another process to, None if profiling is off
+        """
+        if self.profile_dir is None:
+            return None
+        return os.path.join(self.profile_dir, name + '.prof')
+
+    def to_json(self) -> dict:
+        def labelled(key: Key) -> str:
+            name, labels = key
+            return name + ''.join(f'{{{label}={value}}}' for label, value in labels)
+
+        with self._lock:
+            return {
+                'counters': {labelled(key): value for key, value in sorted(self.counters.items())},
+                'gauges': {labelled(key): value for key, value in sorted(self.gauges.items())},
+                'timings': {labelled(key): {'count': count, 'sum': total, 'max': maximum,
+                                            'mean': total / count if count else 0.0}
+                            for key, (count, total, maximum) in sorted(self.summaries.items())},
+            }
+
+    def to_prometheus(self) -> str:
+        def sample(name: str, labels: Tuple[Tuple[str, str], ...], value: float) -> str:
+            label_text = ','.join(f'{label}="{value}"' for label, value in labels)
+            return f'{PREFIX}{name}{{{label_text}}} {value}' if label_text else f'{PREFIX}{name} {value}'
+
+        lines = []
+        typed = set()
+        with self._lock:
+            for metrics, kind, suffix in ((self.counters, 'counter', '_total'), (self.gauges, 'gauge', '')):
+                for (name, labels), value in sorted(metrics.items()):
+                    if name not in typed:
+                        lines.append(f'# TYPE {PREFIX}{name}{suffix} {kind}')
+                        typed.add(name)
+                    lines.append(sample(name + suffix, labels, value))
+            for (name, labels), (count, total, _) in sorted(self.summaries.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {PREFIX}{name} summary')
+                    typed.add(name)
+                lines.append(sample(name + '_count', labels, count))
+                lines.append(sample(name + '_sum', labels, total))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """
+        Writes the report, as a Prometheus text file if the path ends with .prom, as JSON otherwise
+        :param path: path of the report
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as report_file:
+            if path.endswith('.prom'):
+                report_file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), report_file, indent=2)
+
+
+metrics = Metrics()
+
+
+def run_profiled(profile_path: Optional[str], function: Callable, *args):
+    """
+    Calls the function, profiled with cProfile if a profile path is given. Picklable, so it runs in worker processes
+    :param profile_path: path to dump the profile to, None to not profile
+    :param function: function to call
+    :param args: arguments of the function
+    :return: result of the function
+    """
+    if profile_path is None:
+        return function(*args)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+        profiler.dump_stats(profile_path)
@@ -0,0 +1,153 @@
+import time
+from collections import Counter, defaultdict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from model import constants
+from model.blob_cache import BlobCache
+from model.git_miner import BlobReader, FileChange, head_sha, is_ancestor, iter_commits
+from model.language_extractor import detect_languages, get_language_variables, needs_source_code
+from model.metrics import metrics
+
+
+class RepoMiningResult(NamedTuple):
+    """
+    Compact per-repository result sent from a mining worker back to the parent process
+    """
+    url: str
+    developers: Dict[str, Tuple[Dict[str, int], Dict[str, int]]]
+    commits: int
+    files: int
+    error: Optional[str] = None
+    head: Optional[str] = None
+    traversal_seconds: float = 0.0
+    extraction_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    blob_cache_hits: int = 0
+    blob_cache_misses: int = 0
+
+
+def extraction_key(file: FileChange, language: str) -> str:
+    """
+    Cache key of the identifiers extracted from a file change: identifiers of a whole added file depend on its blob,
+    identifiers of the changed hunks of a modified file depend on the pair of blobs. The language is detected from
+    the path rather than the contents, so it is part of the key too
+    """
+    return language + ':' + (file.new_blob if file.is_added else file.old_blob + ':' + file.new_blob)
+
+
+def _extract_blobs(changes: Dict[str, Tuple[FileChange, str]], blob_reader: BlobReader,
+                   deadline: Optional[float] = None) -> Dict[str, Tuple[str, Dict[str, int]]]:
+    """
+    Extracts variables of file changes missing from the blob cache
+    :param changes: dict with extraction key and (file change, language) value
+    :param blob_reader: reader of blob contents
+    :param deadline: time.monotonic() value after which the remaining changes are not extracted
+    :return: dict with extraction key and (language, variables counts) value, of the extracted changes only,
+    the language is empty if the contents turned out to be binary or generated
+    """
+    results = dict()
+    for key, (file, language) in changes.items():
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        language, variables = get_language_variables(file.path, blob_reader.read(file.new_blob), language,
+                                                     None if file.is_added else file.added_hunks)
+        results[key] = (language, dict(variables))
+    return results
+
+
+def mine_repository(url: str, repo_path: str, commits_limit: int, timeout: float = None,
+                    blob_cache_path: Optional[str] = '', since: Optional[str] = None) -> RepoMiningResult:
+    """
+    Extracts languages and variables used by each author of the last commits. Runs in a worker process
+    :param url: url of the repository
+    :param repo_path: path to the cloned repository
+    :param commits_limit: number of commits to mine
+    :param timeout: seconds after which mining stops and the partial result is returned
+    :param blob_cache_path: path of the blob cache, BLOB_CACHE_PATH if empty, no cache if None
+    :param since: commit mined by a previous run, only commits after it are mined if it is in the clone
+    :return: languages and variables counts per author email
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    cpu_start = time.thread_time()
+    traversal_seconds = extraction_seconds = 0.0
+    cache_hits = cache_misses = 0
+    developers = defaultdict(lambda: (Counter(), Counter()))
+    commits = 0
+    files = 0
+    error = None
+    head = None
+    try:
+        head = head_sha(repo_path)
+        revision_range = f'{since}..{head}' if since is not None and is_ancestor(repo_path, since, head) else head
+        with BlobReader(repo_path) as blob_reader:
+            start = time.perf_counter()
+            changes = []
+            for commit in iter_commits(repo_path, commits_limit, revision_range, with_hunks=True):
+                if deadline is not None and time.monotonic() > deadline:
+                    error = f'timed out after {commits} commits'
+                    break
+                commits += 1
+                for file in commit.files:
+                    if not file.is_deleted:
+                        changes.append((commit.author_email, file))
+
+            traversal_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            # languages are detected per path, identical contents at different paths may be different languages
+            paths = {file.path: file.new_blob for _, file in changes}
+            file_languages = detect_languages(list(paths), lambda path: blob_reader.read(paths[path], constants.CONTENT_SNIFF_BYTES))
+            unique_changes = dict()
+            for _, file in changes:
+                language = file_languages[file.path]
+                if language and needs_source_code(language):
+                    unique_changes.setdefault(extraction_key(file, language), (file, language))
+            if blob_cache_path is None:
+                blob_infos = _extract_blobs(unique_changes, blob_reader, deadline)
+                cache_misses = len(blob_infos)
+            else:
+                with BlobCache(blob_cache_path or constants.BLOB_CACHE_PATH) as blob_cache:
+                    blob_infos = blob_cache.get_many(unique_changes)
+                    extracted = _extract_blobs({key: change for key, change in unique_changes.items()
+                                                if key not in blob_infos}, blob_reader, deadline)
+                    blob_cache.put_many(extracted)
+                    cache_hits, cache_misses = len(blob_infos), len(extracted)
+                    blob_infos.update(extracted)
+            extraction_seconds = time.perf_counter() - start
+            if error is None and len(blob_infos) < len(unique_changes):
+                error = f'timed out after extracting {len(blob_infos)} of {len(unique_changes)} file changes'
+
+            for author_email, file in changes:
+                files += 1
+                languages, variables = developers[author_email]
+                language = file_languages[file.path]
+                if not language:
+                    continue
+                key = extraction_key(file, language) if needs_source_code(language) else None
+                if key in blob_infos and not blob_infos[key][0]:
+                    continue
+                languages[language] += 1
+                if key in blob_infos:
+                    variables.update(blob_infos[key][1])
+    except Exception as exception:
+        error = str(exception)
+
+    return RepoMiningResult(url, {author: (dict(languages), dict(variables))
+                                  for author, (languages, variables) in developers.items()},
+                            commits, files, error, head, traversal_seconds, extraction_seconds,
+                            time.thread_time() - cpu_start, cache_hits, cache_misses)
+
+
+def record_mining(result: RepoMiningResult) -> None:
+    """
+    Adds a mining result, possibly computed in a worker process, to the metrics of this process
+    :param result: result of mine_repository
+    """
+    metrics.inc('mined_repos', status='error' if result.error is not None else 'ok')
+    metrics.inc('mined_commits', result.commits)
+    metrics.inc('mined_files', result.files)
+    metrics.inc('mining_traversal_seconds', result.traversal_seconds)
+    metrics.inc('mining_extraction_seconds', result.extraction_seconds)
+    metrics.inc('mining_cpu_seconds', result.cpu_seconds)
+    metrics.inc('blob_cache_requests', result.blob_cache_hits, result='hit')
+    metrics.inc('blob_cache_requests', result.blob_cache_misses, result='miss')
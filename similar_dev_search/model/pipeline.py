@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+from model import constants
+from model.metrics import metrics
+
+Emit = Callable[[Any], Awaitable[None]]
+
+_DONE = object()
+
+
+class Stage:
+    """
+    Pipeline stage: `concurrency` workers take items from a bounded input queue and pass them to `handler`,
+    which emits any number of items into the next stage. A full queue blocks the emitting stage (backpressure).
+    `finish` is called once after the last item, e.g. to emit the results of an aggregating stage
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any, Emit], Awaitable[None]], concurrency: int = 1,
+                 queue_size: int = None, finish: Callable[[Emit], Awaitable[None]] = None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue_size = queue_size or constants.PIPELINE_QUEUE_SIZE
+        self.finish = finish
+        self.processed = 0
+        self.input: Optional[asyncio.Queue] = None
+
+    async def run(self, output: Optional['Stage']) -> None:
+        async def emit(item: Any) -> None:
+            if output is not None:
+                await output.input.put(item)
+
+        async def worker() -> None:
+            while True:
+                item = await self.input.get()
+                if item is _DONE:
+                    # let the other workers of the stage see the end of the input too
+                    self.input.put_nowait(_DONE)
+                    return
+                start = time.perf_counter()
+                try:
+                    await self.handler(item, emit)
+                except Exception as error:
+                    metrics.inc('pipeline_stage_errors', stage=self.name)
+                    print(f'Something went wrong in stage {self.name} with {item}: {error!r}')
+                # includes time blocked on a full output queue, which shows backpressure from the next stage
+                metrics.inc('pipeline_stage_busy_seconds', time.perf_counter() - start, stage=self.name)
+                metrics.inc('pipeline_stage_items', stage=self.name)
+                self.processed += 1
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+            if self.finish is not None:
+                await self.finish(emit)
+        finally:
+            metrics.inc('pipeline_stage_wall_seconds', time.perf_counter() - start, stage=self.name)
+            if output is not None:
+                await output.input.put(_DONE)
+
+
+class Pipeline:
+    """
+    Chain of stages joined by bounded queues, all stages run concurrently
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+
+    async def run(self, items: Iterable[Any]) -> None:
+        """
+        Feeds the items into the first stage and waits until every stage has processed everything
+        :param items: input items of the first stage
+        """
+        for stage in self.stages:
+            # +1 leaves room for the end marker that finished workers put back
+            stage.input = asyncio.Queue(maxsize=stage.queue_size + 1)
+        tasks = [asyncio.ensure_future(stage.run(next_stage))
+                 for stage, next_stage in zip(self.stages, self.stages[1:] + [None])]
+        try:
+            for item in items:
+                await self.stages[0].input.put(item)
+            await self.stages[0].input.put(_DONE)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
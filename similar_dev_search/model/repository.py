@@ -1,13 +1,12 @@
-from collections import defaultdict
-from typing import List, Tuple, Counter
-import httpx
-import pydriller
-from tqdm import tqdm
+import asyncio
+from typing import Dict, List, Optional
 
 import model.fetcher as fetcher
-from git import Repo
-
+from model import constants
+from model.mining import RepoMiningResult, mine_repository, record_mining
+from model.clone_pool import ClonePool, default_pool
 from model.developer_entry import DeveloperEntry
+from model.github_session import GitHubSession
 
 
 class Repository:
@@ -19,63 +18,63 @@ class Repository:
         self.developers = None
         self.dev_id = self.url.split('/')[-2]
         self.repo_name = self.url.split('/')[-1]
-        self.repo_path = f'repositories/{self.repo_name}'
-        Repo.clone_from(self.url, self.repo_path)
-        self.modifications = defaultdict(DeveloperEntry)
+        self.repo_path = None
 
     def __str__(self):
         return self.url
 
-    async def get_stargazers(self, asyncio_client: httpx.AsyncClient = None) -> List[str]:
+    async def clone(self, clone_pool: ClonePool = None, since: Optional[str] = None) -> str:
+        """
+        Clones the repository if it is not cloned yet. Cloning is lazy: only repositories that are mined get cloned
+        :param clone_pool: pool to clone in, shared default pool if not given
+        :param since: commit mined by a previous run, fetched history reaches it if possible
+        :return: path to the cloned repository
+        """
+        if self.repo_path is None:
+            pool = clone_pool if clone_pool is not None else default_pool
+            self.repo_path = await pool.clone(self.url, since)
+        return self.repo_path
+
+    async def get_stargazers(self, session: GitHubSession = None) -> List[str]:
         """
         Gets list of stargazers' urls
-        :param asyncio_client:
+        :param session: GitHub session to perform requests from
         :return: list of urls of stargazers of the repo
         """
         if self.stargazers is not None:
             return self.stargazers
 
-        if asyncio_client is None:
-            client = httpx.AsyncClient(timeout=None)
-        else:
-            client = asyncio_client
-
-        developers_urls = await fetcher.fetch_stargazers_for_repo(self.url)
+        self.stargazers = await fetcher.fetch_stargazers_for_repo(self.url, session)
+        return self.stargazers
 
-        await client.aclose()
-        return developers_urls
-
-    async def _add_file_info(self, author_id: str, file: ModifiedFile) -> None:
+    def set_mining_result(self, result: RepoMiningResult) -> Dict[str, DeveloperEntry]:
         """
-        Add information about modified file to developer information.
-        :param author_id: Unique name of GitHub developer.
-        :param file: File from GitHub repository.
-        :param repo_name: Name of repository.
+        Stores developers mined from the repository, possibly in another process
+        :param result: result of mine_repository
+        :return: dict key = developer email, value = interned languages and variables counts
         """
-        if file.content:
-            # TODO add languages and variables in next prs
-            self.modifications[file.filename][0][author_id] += file.added_lines
-            self.modifications[file.filename][1][author_id] += file.deleted_lines
+        self.developers = {author_id: DeveloperEntry.from_dicts(languages, variables)
+                           for author_id, (languages, variables) in result.developers.items()}
+        if result.error is not None:
+            print('Something went wrong when analyzing ' + self.url + '.git: ' + result.error)
+        return self.developers
 
-    async def get_developers(self) -> Counter[DeveloperEntry]:
+    async def get_developers(self, clone_pool: ClonePool = None) -> Dict[str, DeveloperEntry]:
         """
         Extract info about developers and their commits.
-        :param path_to_repo: Path to GitHub repository.
-        :return dict key = developer url, value = tuple of languages and variables dicts
+        :param clone_pool: pool to clone the repository in, if it is not cloned yet
+        :return dict key = developer email, value = interned languages and variables counts
         """
         if self.developers is not None:
             return self.developers
 
-        self.developers = defaultdict(DeveloperEntry)
-
         try:
-             for commit in tqdm(list((pydriller.Repository(self.repo_path)).traverse_commits())[:COMMITS_PER_REPO],
-                                "Parsing commits for " + self.url):
-                author_id = commit.author.email
-
-                for file in commit.modified_files:
-                    await self._add_file_info(author_id, file)
+            await self.clone(clone_pool)
         except Exception as error:
-            print('Something went wrong when analyzing ' + self.url + '.git: ' + str(error))
-            pass
-        return self.developers
\ No newline at end of file
+            print('Something went wrong when cloning ' + self.url + '.git: ' + str(error))
+            self.developers = dict()
+            return self.developers
+
+        result = await asyncio.to_thread(mine_repository, self.url, self.repo_path, constants.COMMITS_PER_REPO)
+        record_mining(result)
+        return self.set_mining_result(result)
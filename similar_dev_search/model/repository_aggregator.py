@@ -1,93 +1,290 @@
 import asyncio
-from collections import Counter, defaultdict
-from typing import List, Tuple
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-import httpx
 from tqdm import tqdm
 
-from model.constants import N_REPOS_FROM_STARGAZERS
+import model.fetcher as fetcher
+from model import constants
+from model.checkpoint import Checkpoint
+from model.coalescer import Coalescer
 from model.developer import Developer
 from model.developer_entry import DeveloperEntry
+from model.feature_store import FeatureStore
+from model.features import FeatureCounts
+from model.git_miner import head_sha
+from model.github_session import GitHubSession
+from model.heavy_hitters import SpaceSaving
+from model.metrics import metrics, run_profiled
+from model.mining import RepoMiningResult, mine_repository, record_mining
+from model.pipeline import Emit, Pipeline, Stage
 from model.repository import Repository
 
 
 class RepositoryAggregator:
-    def __init__(self, starting_repo: Repository):
+    def __init__(self, starting_repo: Repository, feature_store: FeatureStore = None, checkpoint: Checkpoint = None,
+                 resume: bool = False, shared: Coalescer = None):
         self.starting_repo = starting_repo
-        self.top_repos = Counter()
+        self.feature_store = feature_store
+        self.checkpoint = checkpoint
+        self.resume = resume
+        # starred repositories and mining results shared with the aggregators of other seed repositories
+        self.shared = shared
+        self.top_repos = SpaceSaving()
         self.developers_dict = None
         self.developers_list = None
         self.repos = None
 
-    async def get_developers(self, asyncio_client: httpx.AsyncClient = None) -> List[Developer]:
+    async def get_developers(self, session: GitHubSession = None) -> List[Developer]:
         """
-        Returns a dict for each developer with their languages and variables
-        :param asyncio_client:
+        Returns a dict for each developer with their languages and variables.
+        Stargazer pages, starred repositories pages, ranking, cloning, mining and aggregation run as one
+        pipeline of stages joined by bounded queues, so cloning and mining start as soon as the ranking is known.
+        With a checkpoint, progress is saved as the pipeline goes, and a resumed run starts from the saved progress
+        :param session: GitHub session to perform requests from
         :return: dict of tuple of dicts - for languages and variables respectively
         """
         if self.developers_list is not None:
             return self.developers_list
 
-        if asyncio_client is None:
-            client = httpx.AsyncClient(timeout=None)
+        if session is None:
+            github_session = GitHubSession()
         else:
-            client = asyncio_client
+            github_session = session
 
-        self.developers_dict = defaultdict(DeveloperEntry)
-        tasks = []
-        for repo in tqdm((await self.get_repos(client))[:N_REPOS_FROM_STARGAZERS], "Analyzing repos"):
-            tasks.append(repo.get_developers())
+        seed = self.starting_repo.url
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            checkpoint.start(seed, self.resume)
+            if self.repos is None and checkpoint.ranking(seed) is not None:
+                self.repos = [Repository(url) for url in checkpoint.ranking(seed)]
+
+        collected = defaultdict(lambda: ([], []))
+        progress = tqdm(total=len(self.repos) if self.repos is not None else None, desc="Analyzing repos")
+
+        async def emit_stargazers(repo: Repository, emit: Emit) -> None:
+            # stargazers of an interrupted run first, those with saved starred repositories are counted already
+            stargazers = checkpoint.fetched_stargazers(seed) if checkpoint is not None else []
+            fetched = set(stargazers)
+            for stargazer_url in stargazers:
+                if stargazer_url not in starred:
+                    await emit(Developer(stargazer_url))
+            failures = []
+            async for page in fetcher.iter_stargazers(repo.url, github_session, failures):
+                new_stargazers = [stargazer_url for stargazer_url in page if stargazer_url not in fetched]
+                fetched.update(new_stargazers)
+                stargazers.extend(new_stargazers)
+                # saved before emitting, since emitting waits for the downstream stages
+                if checkpoint is not None:
+                    checkpoint.save_stargazers_page(seed, new_stargazers)
+                for stargazer_url in new_stargazers:
+                    if stargazer_url not in starred:
+                        await emit(Developer(stargazer_url))
+            # a resumed run must fetch the missing pages again
+            if checkpoint is not None and not failures:
+                checkpoint.save_stargazers(seed, stargazers)
+
+        async def fetch_starred_repos(stargazer: Developer) -> Tuple[List[str], bool]:
+            failures = []
+            starred = [repo_url async for page in fetcher.iter_starred_repos(stargazer.id, github_session, failures)
+                       for repo_url in page]
+            return starred, not failures
+
+        async def emit_starred_repos(stargazer: Developer, emit: Emit) -> None:
+            if self.shared is not None:
+                starred, complete = await self.shared.run('starred:' + stargazer.url,
+                                                          lambda: fetch_starred_repos(stargazer))
+                for repo_url in starred:
+                    await emit(repo_url)
+            else:
+                starred = []
+                failures = []
+                async for page in fetcher.iter_starred_repos(stargazer.id, github_session, failures):
+                    for repo_url in page:
+                        starred.append(repo_url)
+                        await emit(repo_url)
+                complete = not failures
+            if checkpoint is not None and complete:
+                checkpoint.save_starred(seed, stargazer.url, starred)
+
+        async def count_repo(repo_url: str, _: Emit) -> None:
+            self.top_repos.add(repo_url)
 
-        result = await asyncio.gather(*tasks)
+        async def emit_top_repos(emit: Emit) -> None:
+            self.repos = [Repository(url) for url, _ in self.top_repos.most_common(constants.N_REPOS_FROM_STARGAZERS)]
+            progress.reset(total=len(self.repos))
+            if checkpoint is not None:
+                checkpoint.save_ranking(seed, [repo.url for repo in self.repos])
+            for repo in self.repos:
+                await emit(repo)
 
-        for gathered_devs in tqdm(result, "Processing developers: " + str(len(result))):
-            for developer, (languages, variables) in gathered_devs:
-                for language, count in languages:
-                    self.developers_dict[developer][0][language] += count
-                for variable, count in variables:
-                    self.developers_dict[developer][0][variable] += count
+        async def clone(repo: Repository, emit: Emit) -> None:
+            try:
+                await repo.clone(since=self._since(repo))
+            except Exception as error:
+                print('Something went wrong when cloning ' + repo.url + '.git: ' + str(error))
+                repo.developers = dict()
+                progress.update()
+                return
+            await emit(repo)
+
+        async def mine(repo: Repository, emit: Emit) -> None:
+            if self.shared is not None:
+                result, repo.developers = await self.shared.run('mined:' + repo.url, lambda: self._mine(repo, executor))
+                await emit((result, repo.developers))
+            else:
+                await emit(await self._mine(repo, executor))
+
+        async def aggregate(mined: Tuple[RepoMiningResult, Dict[str, DeveloperEntry]], _: Emit) -> None:
+            result, repo_developers = mined
+            if checkpoint is not None and result.error is None:
+                checkpoint.save_mined(seed, result)
+            progress.update()
+            progress.set_postfix(commits=result.commits, files=result.files)
+            for developer, (languages, variables) in repo_developers.items():
+                collected[developer][0].append(languages)
+                collected[developer][1].append(variables)
+
+        workers = constants.MINING_WORKERS or os.cpu_count()
+        mining_stages = [
+            Stage('clone', clone, constants.CLONE_CONCURRENCY),
+            # a few more repositories than workers keep the pool busy while results are being sent back
+            Stage('mine', mine, workers + 2, queue_size=workers),
+            Stage('aggregate', aggregate),
+        ]
+        crawl_stages = [
+            Stage('stargazers', emit_stargazers),
+            Stage('starred repos', emit_starred_repos, constants.STARGAZERS_CONCURRENCY),
+            Stage('ranking', count_repo, finish=emit_top_repos),
+        ]
+        starred = checkpoint.starred(seed) if checkpoint is not None else dict()
+        if checkpoint is not None:
+            # repositories ranked by a resumed run are counted again for print_popular_repos
+            self.top_repos = SpaceSaving()
+            for repo_urls in starred.values():
+                for repo_url in repo_urls:
+                    self.top_repos.add(repo_url)
+
+        if self.repos is not None:
+            stages, items = mining_stages, []
+            for repo in self.repos[:constants.N_REPOS_FROM_STARGAZERS]:
+                result = checkpoint.mined(seed, repo.url) if checkpoint is not None and self.resume else None
+                if result is None:
+                    items.append(repo)
+                else:
+                    await aggregate((result, repo.set_mining_result(result)), None)
+        elif checkpoint is not None and checkpoint.stargazers(seed) is not None:
+            stages = crawl_stages[1:] + mining_stages
+            items = [Developer(url) for url in checkpoint.stargazers(seed) if url not in starred]
+        else:
+            if checkpoint is None:
+                self.top_repos = SpaceSaving()
+            stages, items = crawl_stages + mining_stages, [self.starting_repo]
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            try:
+                await Pipeline(stages).run(items)
+            finally:
+                progress.close()
+                if checkpoint is not None:
+                    checkpoint.flush()
+
+        if self.feature_store is not None:
+            # profiles accumulated over all runs and repositories instead of this run's commits only
+            self.developers_dict = {developer: DeveloperEntry.from_dicts(languages, variables)
+                                    for developer, (languages, variables)
+                                    in self.feature_store.load_profiles(collected).items()}
+        else:
+            self.developers_dict = {
+                developer: DeveloperEntry(FeatureCounts.merge(languages), FeatureCounts.merge(variables))
+                for developer, (languages, variables) in collected.items()
+            }
 
         self.developers_list = []
-        for developer, (languages, variables) in self.developers_dict:
+        for developer, (languages, variables) in self.developers_dict.items():
             gathered_dev = Developer(developer)
             gathered_dev.languages = languages
             gathered_dev.variables = variables
             self.developers_list.append(gathered_dev)
 
-        await client.aclose()
+        if session is None:
+            await github_session.aclose()
 
         return self.developers_list
 
-    async def get_repos(self, asyncio_client: httpx.AsyncClient = None) -> List[Repository]:
+    def _since(self, repo: Repository) -> Optional[str]:
+        """
+        HEAD commit the feature store has mined the repository at, None if there is no store or it was never mined
+        """
+        return self.feature_store.get_head(repo.url) if self.feature_store is not None else None
+
+    async def _mine(self, repo: Repository, executor: ProcessPoolExecutor) \
+            -> Tuple[RepoMiningResult, Dict[str, DeveloperEntry]]:
+        """
+        Clones the repository and mines it in a worker process.
+        With a feature store, only commits after the previously mined HEAD are mined
+        :param repo: repository to mine
+        :param executor: pool of mining worker processes
+        :return: mining result and mined developers, empty if cloning or mining failed
+        """
+        try:
+            since = self._since(repo)
+            repo_path = await repo.clone(since=since)
+            if since is not None and since == await asyncio.to_thread(head_sha, repo_path):
+                metrics.inc('repos_unchanged')
+                result = RepoMiningResult(repo.url, self.feature_store.repo_developers(repo.url), 0, 0, head=since)
+                return result, repo.set_mining_result(result)
+
+            loop = asyncio.get_running_loop()
+            profile_path = metrics.profile_path(os.path.join('mine', repo.dev_id + '_' + repo.repo_name))
+            # the worker stops by itself at the timeout, the extra minute covers waiting for a free worker
+            result = await asyncio.wait_for(
+                loop.run_in_executor(executor, run_profiled, profile_path, mine_repository, repo.url, repo_path,
+                                     constants.COMMITS_PER_REPO, constants.MINING_TIMEOUT_SECONDS, '', since),
+                timeout=constants.MINING_TIMEOUT_SECONDS + 60)
+            record_mining(result)
+            if self.feature_store is not None and result.error is None:
+                self.feature_store.apply(repo.url, result.head, result.developers)
+                result = result._replace(developers=self.feature_store.repo_developers(repo.url))
+        except asyncio.TimeoutError:
+            result = RepoMiningResult(repo.url, dict(), 0, 0, 'timed out')
+        except Exception as error:
+            result = RepoMiningResult(repo.url, dict(), 0, 0, str(error))
+        return result, repo.set_mining_result(result)
+
+    async def get_repos(self, session: GitHubSession = None) -> List[Repository]:
         """
         Return list of most popular repositories for stargazers of initial repo
-        :param asyncio_client:
+        :param session: GitHub session to perform requests from
         :return:
         """
         if self.repos is not None:
             return self.repos
 
-        if asyncio_client is None:
-            client = httpx.AsyncClient(timeout=None)
+        if session is None:
+            github_session = GitHubSession()
         else:
-            client = asyncio_client
+            github_session = session
 
-        stargazers = [Developer(url) for url in await self.starting_repo.get_stargazers()]
-        self.top_repos = Counter()
+        stargazers = [Developer(url) for url in await self.starting_repo.get_stargazers(github_session)]
+        self.top_repos = SpaceSaving()
         tasks = []
 
         for stargazer in stargazers:
-            tasks.append(stargazer.get_stargazed_repos(client))
-
-        result = await asyncio.gather(*tasks)
+            tasks.append(stargazer.get_stargazed_repos(github_session))
 
-        for repos in result:
-            for repo in repos:
-                self.top_repos[repo.url] += 1
+        for task in asyncio.as_completed(tasks):
+            for repo in await task:
+                self.top_repos.add(repo.url)
 
-        sorted_repos = [Repository(url) for url, _ in self.top_repos.most_common()]
+        # only the final top repositories become Repository objects
+        sorted_repos = [Repository(url) for url, _ in self.top_repos.most_common(constants.N_REPOS_FROM_STARGAZERS)]
 
         self.repos = sorted_repos
-        await client.aclose()
+        if session is None:
+            await github_session.aclose()
 
         return self.repos
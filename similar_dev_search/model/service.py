@@ -0,0 +1,328 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from git import GitCommandError
+
+from model import constants
+from model.batch import repository_profile
+from model.clone_pool import ClonePool
+from model.coalescer import Coalescer
+from model.developer import Developer
+from model.developer_entry import DeveloperEntry
+from model.feature_store import FeatureStore
+from model.git_miner import head_sha
+from model.github_session import GitHubSession
+from model.metrics import metrics
+from model.mining import RepoMiningResult, mine_repository, record_mining
+from model.repository import Repository
+from model.similarity import SimilarityEngine
+
+STATUS_TEXTS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+Answer = Tuple[int, dict]
+
+
+class Failure(NamedTuple):
+    status: int
+    error: str
+    failed_at: float
+    attempts: int
+
+    def retry_at(self) -> float:
+        return self.failed_at + min(constants.SERVICE_RETRY_SECONDS * 2 ** (self.attempts - 1),
+                                    constants.SERVICE_MAX_RETRY_SECONDS)
+
+
+def failure_status(error: Exception) -> int:
+    """
+    Status to answer a failed refresh with: 404 if the login or repository does not exist, 503 otherwise
+    """
+    if isinstance(error, LookupError):
+        return 404
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 404:
+        return 404
+    if isinstance(error, GitCommandError) and 'not found' in str(error).lower():
+        return 404
+    return 503
+
+
+class QueryService:
+    """
+    Resident similarity service: developer profiles of the feature store are loaded into a similarity engine once,
+    and queries for the developers most similar to a developer, a GitHub login or a repository are answered
+    from memory over a local HTTP/JSON API.
+    Profiles of logins and repositories that are not known yet are mined in the background, a query for them
+    is answered with 202 until they are ready. Concurrent queries and refreshes with the same key share
+    one computation. A failed refresh is answered with its error and retried after an exponential backoff
+    """
+
+    def __init__(self, feature_store: FeatureStore, session: GitHubSession = None):
+        self.feature_store = feature_store
+        self.session = session
+        self.engine: Optional[SimilarityEngine] = None
+        # mined profiles of logins and repositories, least recently used first
+        self.profiles: OrderedDict[str, Developer] = OrderedDict()
+        self.failures: Dict[str, Failure] = dict()
+        self.queries = Coalescer(keep_results=False)
+        self.refreshes = Coalescer(keep_results=False)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # a resident service must fetch repositories again instead of reusing the clones of its first query
+        self._clone_pool = ClonePool(keep_clones=False)
+        self._background = set()
+        self._loaded_at = 0.0
+        self._reload_scheduled = False
+
+    def load(self) -> None:
+        """
+        (Re)builds the similarity engine from all profiles of the feature store.
+        Runs in a thread, so it reads the store through a connection of its own
+        """
+        feature_store = FeatureStore(self.feature_store.path)
+        try:
+            profiles = feature_store.load_profiles()
+        finally:
+            feature_store.close()
+        developers = []
+        for author, (languages, variables) in profiles.items():
+            developer = Developer(author)
+            entry = DeveloperEntry.from_dicts(languages, variables)
+            developer.languages = entry.languages
+            developer.variables = entry.variables
+            developers.append(developer)
+        self.engine = SimilarityEngine(developers)
+        metrics.set_gauge('service_developers', len(developers))
+
+    def _remember(self, key: str, profile: Developer) -> None:
+        self.profiles[key] = profile
+        self.profiles.move_to_end(key)
+        while len(self.profiles) > constants.SERVICE_PROFILES_CACHE_SIZE:
+            self.profiles.popitem(last=False)
+
+    async def _mine_repository(self, url: str) -> Dict[str, DeveloperEntry]:
+        """
+        Clones and mines a repository, and adds its developers to the feature store.
+        Only commits after the HEAD the store has mined the repository at are mined and added
+        """
+        repo = Repository(url)
+        since = self.feature_store.get_head(url)
+        repo_path = await repo.clone(self._clone_pool, since)
+        if since is not None and since == await asyncio.to_thread(head_sha, repo_path):
+            metrics.inc('repos_unchanged')
+            result = RepoMiningResult(url, self.feature_store.repo_developers(url), 0, 0, head=since)
+            return repo.set_mining_result(result)
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, mine_repository, url, repo_path,
+                                            constants.COMMITS_PER_REPO, constants.MINING_TIMEOUT_SECONDS, '', since)
+        record_mining(result)
+        if result.error is not None:
+            raise RuntimeError(result.error)
+        self.feature_store.apply(url, result.head, result.developers)
+        return repo.set_mining_result(result._replace(developers=self.feature_store.repo_developers(url)))
+
+    async def _refresh_repository(self, url: str) -> Developer:
+        developers = await self.refreshes.run('mine:' + url, lambda: self._mine_repository(url))
+        return repository_profile(url, developers)
+
+    async def _login_emails(self, login: str, urls: List[str]) -> Set[str]:
+        """
+        Author emails of the login: its GitHub noreply addresses and the emails of its commits to the repositories
+        """
+        async def commit_emails(url: str) -> List[str]:
+            owner, name = url.rstrip('/').split('/')[-2:]
+            response = await self.session.get(f'https://api.github.com/repos/{owner}/{name}/commits'
+                                              f'?author={login}&per_page=100')
+            return [commit['commit']['author']['email'] for commit in response.json()]
+
+        emails = {f'{login}@users.noreply.github.com'.lower()}
+        for repo_emails in await asyncio.gather(*[commit_emails(url) for url in urls]):
+            emails.update(email.lower() for email in repo_emails)
+        return emails
+
+    async def _refresh_login(self, login: str) -> Developer:
+        """
+        Profile of a GitHub login: its own commits to its most recently pushed repositories mined together
+        """
+        response = await self.session.get(f'https://api.github.com/users/{login}/repos?sort=pushed&per_page=100')
+        urls = [repo_json['html_url'] for repo_json in response.json()
+                if not repo_json.get('fork')][:constants.REPOS_LIMIT]
+        mined, emails = await asyncio.gather(
+            asyncio.gather(*[self.refreshes.run('mine:' + url, lambda url=url: self._mine_repository(url))
+                             for url in urls]),
+            self._login_emails(login, urls))
+        noreply_suffix = f'+{login}@users.noreply.github.com'.lower()
+        developers = {(url, author): entry for url, repo_developers in zip(urls, mined)
+                      for author, entry in repo_developers.items()
+                      if author.lower() in emails or author.lower().endswith(noreply_suffix)}
+        if not developers:
+            raise LookupError(f'No commits of {login} found in its repositories')
+        return repository_profile('https://github.com/' + login, developers)
+
+    async def _refresh(self, key: str) -> None:
+        kind, value = key.split(':', 1)
+        try:
+            profile = await (self._refresh_login(value) if kind == 'login' else self._refresh_repository(value))
+        except Exception as error:
+            metrics.inc('service_refreshes', status='error')
+            previous = self.failures.get(key)
+            self.failures[key] = Failure(failure_status(error), str(error), time.time(),
+                                         previous.attempts + 1 if previous is not None else 1)
+            return
+        metrics.inc('service_refreshes', status='ok')
+        self.failures.pop(key, None)
+        self._remember(key, profile)
+        # developers of the mined repositories become answers of later queries
+        self._schedule_reload()
+
+    async def _reload(self) -> None:
+        delay = self._loaded_at + constants.SERVICE_RELOAD_SECONDS - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # refreshes finishing while the store is being loaded schedule the next reload
+        self._reload_scheduled = False
+        self._loaded_at = time.monotonic()
+        await asyncio.to_thread(self.load)
+
+    def _schedule_reload(self) -> None:
+        """
+        Rebuilds the engine at most every SERVICE_RELOAD_SECONDS, so refreshes share one rebuild
+        instead of loading the whole store each
+        """
+        if not self._reload_scheduled:
+            self._reload_scheduled = True
+            self._spawn(self._reload())
+
+    def _spawn(self, coroutine: Awaitable) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _start_refresh(self, key: str) -> None:
+        if key in self.refreshes:
+            return
+        self._spawn(self.refreshes.run(key, lambda: self._refresh(key)))
+
+    def _profile(self, kind: str, value: str) -> Optional[Developer]:
+        if kind == 'developer':
+            row = self.engine.index.get(value)
+            return self.engine.developers[row] if row is not None else None
+        if kind == 'repo':
+            developers = self.feature_store.repo_developers(value)
+            if developers:
+                return repository_profile(value, {author: DeveloperEntry.from_dicts(languages, variables)
+                                                  for author, (languages, variables) in developers.items()})
+        profile = self.profiles.get(kind + ':' + value)
+        if profile is not None:
+            self.profiles.move_to_end(kind + ':' + value)
+        return profile
+
+    async def similar(self, kind: str, value: str, k: int) -> Answer:
+        """
+        Answers a query for the developers most similar to a developer, a login or a repository
+        :param kind: 'developer' for a developer id of the feature store, 'login' or 'repo'
+        :param value: developer id, GitHub login or repository url
+        :param k: number of developers to return
+        :return: http status and json answer
+        """
+        if kind == 'repo':
+            value = value.rstrip('/')
+        key = f'{kind}:{value}'
+        profile = self._profile(kind, value)
+        if profile is None:
+            if kind == 'developer':
+                return 404, {'error': f'Unknown developer {value}'}
+            failure = self.failures.get(key)
+            if failure is not None and time.time() < failure.retry_at():
+                return failure.status, {'error': failure.error}
+            self._start_refresh(key)
+            return 202, {'status': 'refreshing', 'query': {kind: value}}
+
+        engine = self.engine
+        similar = await self.queries.run((key, k, id(engine)), lambda: asyncio.to_thread(engine.top_k, profile, k))
+        return 200, {'query': {kind: value},
+                     'similar': [{'developer': developer.url, 'similarity': similarity}
+                                 for developer, similarity in similar]}
+
+    async def answer(self, method: str, target: str) -> Answer:
+        if method != 'GET':
+            return 405, {'error': 'Only GET is supported'}
+        url = urlsplit(target)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path == '/health':
+            return 200, {'status': 'ok', 'developers': len(self.engine.developers),
+                         'refreshing': len(self.refreshes)}
+        if url.path != '/similar':
+            return 404, {'error': f'Unknown path {url.path}'}
+        kinds = [kind for kind in ('developer', 'login', 'repo') if kind in params]
+        if len(kinds) != 1:
+            return 400, {'error': 'Exactly one of developer, login or repo is required'}
+        try:
+            k = int(params.get('k', constants.SIMILAR_DEVELOPERS_NUM))
+        except ValueError:
+            return 400, {'error': 'k must be an integer'}
+        if k < 1:
+            return 400, {'error': 'k must be positive'}
+        return await self.similar(kinds[0], params[kinds[0]], k)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves HTTP/1.1 requests of one connection, keeping it alive between requests
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    break
+                try:
+                    status, answer = await self.answer(parts[0], parts[1])
+                except Exception as error:
+                    status, answer = 500, {'error': str(error)}
+                metrics.inc('service_requests', status=status)
+                body = json.dumps(answer).encode()
+                writer.write(f'HTTP/1.1 {status} {STATUS_TEXTS[status]}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = None, port: int = None) -> None:
+        """
+        Loads the profiles and serves queries until cancelled
+        :param host: host to listen on
+        :param port: port to listen on
+        """
+        host = host or constants.SERVICE_HOST
+        port = port or constants.SERVICE_PORT
+        self._loaded_at = time.monotonic()
+        await asyncio.to_thread(self.load)
+        workers = constants.MINING_WORKERS or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            self._executor = executor
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f'Serving {len(self.engine.developers)} developers on http://{host}:{port}')
+            async with server:
+                await server.serve_forever()
+
+
+async def serve(host: str = None, port: int = None, feature_store: FeatureStore = None) -> None:
+    """
+    Runs the query service with one GitHub session for the background refreshes
+    """
+    async with GitHubSession() as session:
+        await QueryService(feature_store or FeatureStore(), session).serve(host, port)
@@ -0,0 +1,126 @@
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sparse
+
+from model import constants
+from model.developer import Developer
+from model.features import IDENTIFIERS, LANGUAGES, FeatureCounts, Vocabulary
+
+PAIRS_CHUNK_SIZE = 256
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores in descending order, without sorting all of them
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class FeatureBlock:
+    """
+    TF-IDF weighted, L2-normalized sparse matrix of one kind of features (languages or variables).
+    Columns are ids of the global vocabulary, so rows are built straight from the interned arrays
+    """
+
+    def __init__(self, features: Sequence[FeatureCounts], vocabulary: Vocabulary):
+        self.vocabulary = vocabulary
+        shape = (len(features), len(vocabulary))
+        indptr = np.zeros(len(features) + 1, dtype=np.int64)
+        np.cumsum([len(feature) for feature in features], out=indptr[1:])
+        if len(features):
+            indices = np.concatenate([feature.ids for feature in features] + [np.empty(0, dtype=np.int32)])
+            counts = np.concatenate([feature.counts for feature in features] + [np.empty(0, dtype=np.int32)])
+        else:
+            indices, counts = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        matrix = sparse.csr_matrix((np.log1p(counts.astype(np.float32)), indices, indptr), shape=shape)
+
+        document_frequency = np.bincount(matrix.indices, minlength=shape[1])
+        self.idf = (np.log((1 + shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.matrix = self._normalize(matrix @ sparse.diags(self.idf))
+
+    @staticmethod
+    def _normalize(matrix: sparse.spmatrix) -> sparse.csr_matrix:
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+    def vectorize(self, features: FeatureCounts) -> sparse.csr_matrix:
+        """
+        Vector of a developer outside of the matrix, features interned after the matrix was built are dropped
+        """
+        known = features.ids < len(self.idf)
+        columns = features.ids[known]
+        values = np.log1p(features.counts[known].astype(np.float32)) * self.idf[columns]
+        vector = sparse.csr_matrix((values, (np.zeros(len(columns), dtype=np.int32), columns)),
+                                   shape=(1, len(self.idf)))
+        return self._normalize(vector)
+
+
+class SimilarityEngine:
+    """
+    Cosine similarity between developers over TF-IDF weighted languages and variables.
+    The score is LANGUAGES_WEIGHT * languages cosine + (1 - LANGUAGES_WEIGHT) * variables cosine
+    """
+
+    def __init__(self, developers: Sequence[Developer], languages_weight: float = None):
+        self.developers = list(developers)
+        self.index = {developer.url: row for row, developer in enumerate(self.developers)}
+        self.languages_weight = languages_weight if languages_weight is not None else constants.LANGUAGES_WEIGHT
+        self.languages = FeatureBlock([developer.language_features for developer in self.developers], LANGUAGES)
+        self.variables = FeatureBlock([developer.variable_features for developer in self.developers], IDENTIFIERS)
+        self.matrix = self._combine(self.languages.matrix, self.variables.matrix)
+
+    def _combine(self, languages: sparse.spmatrix, variables: sparse.spmatrix) -> sparse.csr_matrix:
+        # scaling blocks by square roots of the weights makes the dot product a weighted sum of block cosines
+        return sparse.hstack([languages * np.sqrt(self.languages_weight),
+                              variables * np.sqrt(1 - self.languages_weight)], format='csr')
+
+    def vectorize(self, developer: Developer) -> sparse.csr_matrix:
+        row = self.index.get(developer.url)
+        if row is not None:
+            return self.matrix[row]
+        return self._combine(self.languages.vectorize(developer.language_features),
+                             self.variables.vectorize(developer.variable_features))
+
+    def scores(self, developer: Developer) -> np.ndarray:
+        """
+        Similarities between the developer and every developer of the engine
+        :param developer: developer to compare with
+        :return: array of similarities in the order of self.developers
+        """
+        return np.asarray((self.matrix @ self.vectorize(developer).T).todense()).ravel()
+
+    def top_k(self, developer: Developer, k: int = None) -> List[Tuple[Developer, float]]:
+        """
+        Most similar developers, the developer itself is excluded
+        :param developer: developer to compare with
+        :param k: number of developers to return
+        :return: list of developers with similarities, most similar first
+        """
+        k = k or constants.SIMILAR_DEVELOPERS_NUM
+        scores = self.scores(developer)
+        row = self.index.get(developer.url)
+        if row is not None:
+            scores[row] = -np.inf
+        return [(self.developers[i], float(scores[i])) for i in _top_k_indices(scores, k) if np.isfinite(scores[i])]
+
+    def all_pairs_top_k(self, k: int = None) -> Iterable[Tuple[Developer, List[Tuple[Developer, float]]]]:
+        """
+        Most similar developers for every developer, computed in chunks of rows to bound memory
+        :param k: number of developers to return for each developer
+        :return: iterator over developers with their most similar developers
+        """
+        k = k or constants.SIMILAR_DEVELOPERS_NUM
+        transposed = self.matrix.T.tocsc()
+        for start in range(0, len(self.developers), PAIRS_CHUNK_SIZE):
+            chunk = np.asarray((self.matrix[start:start + PAIRS_CHUNK_SIZE] @ transposed).todense())
+            for offset, scores in enumerate(chunk):
+                scores[start + offset] = -np.inf
+                yield self.developers[start + offset], [(self.developers[i], float(scores[i]))
+                                                        for i in _top_k_indices(scores, k)
+                                                        if np.isfinite(scores[i])]
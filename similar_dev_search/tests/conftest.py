@@ -0,0 +1,70 @@
+import subprocess
+
+import pytest
+
+
+def _git(path, *args) -> str:
+    return subprocess.run(['git', '-C', str(path), *args], check=True, capture_output=True,
+                          encoding='utf-8').stdout
+
+
+@pytest.fixture
+def git():
+    """
+    Runs a git command in a repository and returns its output: git(path, *args)
+    """
+    return _git
+
+
+@pytest.fixture
+def commit(git):
+    """
+    Writes the files and commits them: commit(path, files, email='author@example.com', message='commit')
+    """
+    def commit(path, files, email='author@example.com', message='commit'):
+        for name, content in files.items():
+            (path / name).parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, bytes):
+                (path / name).write_bytes(content)
+            else:
+                (path / name).write_text(content)
+        git(path, 'add', '.')
+        git(path, '-c', f'user.email={email}', '-c', 'user.name=author', 'commit', '-q', '-m', message)
+
+    return commit
+
+
+@pytest.fixture
+def commit_number(commit):
+    """
+    Commits file{number}.py by author{number}@example.com: commit_number(path, number)
+    """
+    def commit_number(path, number):
+        commit(path, {f'file{number}.py': f'value_{number} = {number}\n'}, f'author{number}@example.com',
+               f'commit {number}')
+
+    return commit_number
+
+
+@pytest.fixture
+def repo(tmp_path, git):
+    """
+    Empty repository
+    """
+    path = tmp_path / 'repo'
+    path.mkdir()
+    git(path, 'init', '-q')
+    return path
+
+
+@pytest.fixture
+def origin(tmp_path, git, commit_number):
+    """
+    Repository with 20 commits, each adding file{number}.py by author{number}@example.com
+    """
+    path = tmp_path / 'origin'
+    path.mkdir()
+    git(path, 'init', '-q')
+    for number in range(20):
+        commit_number(path, number)
+    return path
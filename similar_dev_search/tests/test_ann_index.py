@@ -0,0 +1,59 @@
+import os
+
+from model.ann_index import AnnIndex
+
+OLD = ({'Python': 10}, {f'old_name_{number}': 1 for number in range(50)})
+NEW = ({'Rust': 10}, {f'new_name_{number}': 1 for number in range(50)})
+
+
+def test_newer_profile_supersedes_saved_one(tmp_path):
+    index = AnnIndex(str(tmp_path), tables=8, bits_per_table=8)
+    index.add('developer', *OLD)
+    index.add('other', *NEW)
+    index.save()
+    index.add('developer', *NEW)
+
+    assert len(index) == 2
+    assert dict(index.query(*OLD, probes=0)).get('developer', 0.0) < 1.0
+    index.save()
+
+    reopened = AnnIndex(str(tmp_path))
+    assert len(reopened) == 2
+    assert dict(reopened.query(*OLD, probes=0)).get('developer', 0.0) < 1.0
+    assert dict(reopened.query(*NEW, probes=0))['developer'] == 1.0
+
+
+def test_newer_pending_profile_supersedes_pending_one(tmp_path):
+    index = AnnIndex(str(tmp_path), tables=8, bits_per_table=8)
+    index.add('developer', *OLD)
+    index.add('developer', *NEW)
+
+    assert len(index) == 1
+    assert dict(index.query(*OLD, probes=0)).get('developer', 0.0) < 1.0
+    assert dict(index.query(*NEW, probes=0))['developer'] == 1.0
+
+
+def test_segments_are_merged_past_max_segments(tmp_path):
+    index = AnnIndex(str(tmp_path), tables=8, bits_per_table=8, max_segments=3)
+    for number in range(3):
+        index.add('developer', *(OLD if number % 2 == 0 else NEW))
+        index.add(f'other{number}', *NEW)
+        index.save()
+    assert len(index.segments) == 3
+
+    index.add('developer', *OLD)
+    index.save()
+
+    assert len(index.segments) == 1
+    assert len(index.segments[0].ids) == len(index) == 4
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.ids.json')) == \
+        [index.meta['segments'][0] + '.ids.json']
+    reopened = AnnIndex(str(tmp_path), max_segments=3)
+    assert len(reopened) == 4
+    assert dict(reopened.query(*OLD, probes=0))['developer'] == 1.0
+    assert dict(reopened.query(*NEW, probes=0)).get('developer', 0.0) < 1.0
+
+    reopened.add('another', *NEW)
+    reopened.save()
+    assert len(reopened.segments) == 2
+    assert len(AnnIndex(str(tmp_path))) == 5
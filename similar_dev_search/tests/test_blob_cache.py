@@ -0,0 +1,47 @@
+import sqlite3
+
+from model.blob_cache import BlobCache
+
+
+def test_lookups_do_not_lock_database(tmp_path):
+    path = str(tmp_path / 'blobs.sqlite')
+    cache = BlobCache(path)
+    cache.put_many({'a': ('Python', {'value': 1})})
+
+    assert cache.get_many(['a', 'b']) == {'a': ('Python', {'value': 1})}
+
+    # another worker process writes while this one keeps looking blobs up
+    other = sqlite3.connect(path, timeout=0)
+    with other:
+        other.execute("UPDATE blobs SET accessed_at = 0 WHERE sha = 'a'")
+    other.close()
+    cache.close()
+
+
+def test_size_is_kept_across_puts_and_processes(tmp_path):
+    path = str(tmp_path / 'blobs.sqlite')
+    with BlobCache(path) as cache:
+        cache.put_many({'a': ('Python', {'value': 1}), 'b': ('Go', {})})
+        cache.put_many({'a': ('Python', {'value': 1})})
+        size = cache.size()
+
+    with BlobCache(path) as other:
+        assert other.size() == size
+        assert size == sqlite3.connect(path).execute('SELECT SUM(size) FROM blobs').fetchone()[0]
+
+
+def test_least_recently_used_blobs_are_evicted_past_max_bytes(tmp_path):
+    path = str(tmp_path / 'blobs.sqlite')
+    with BlobCache(path, max_bytes=10 ** 6) as cache:
+        cache.put_many({f'old{number}': ('Python', {}) for number in range(10)})
+        cache.put_many({'used': ('Python', {})})
+        cache.put_many({f'new{number}': ('Python', {}) for number in range(10)})
+        cache.get_many(['used'])
+        row_size = cache.size() // 21
+
+        cache.max_bytes = row_size * 20
+        cache.put_many({'last': ('Python', {})})
+
+        # the cache shrinks below the threshold at once, the pending access time of 'used' is written first
+        assert cache.size() <= cache.max_bytes * 0.9
+        assert set(cache.get_many(['used', 'last', 'old0', 'old3', 'old4'])) == {'used', 'last', 'old4'}
@@ -0,0 +1,20 @@
+from model.checkpoint import Checkpoint
+from model.mining import RepoMiningResult
+
+SEED = 'https://github.com/owner/seed'
+RESULT = RepoMiningResult('https://github.com/owner/repo', {'a@example.com': ({'Python': 1}, {'name': 1})}, 1, 1,
+                          head='0' * 40)
+
+
+def test_fresh_start_clears_mined_results(tmp_path):
+    with Checkpoint(str(tmp_path / 'checkpoint.sqlite')) as checkpoint:
+        checkpoint.start(SEED, resume=False)
+        checkpoint.save_mined(SEED, RESULT)
+
+        checkpoint.start(SEED, resume=True)
+        assert checkpoint.mined(SEED, RESULT.url).developers == RESULT.developers
+        assert checkpoint.mined('https://github.com/owner/other', RESULT.url) is None
+
+        checkpoint.start(SEED, resume=False)
+        assert checkpoint.mined(SEED, RESULT.url) is None
+
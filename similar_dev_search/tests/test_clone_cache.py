@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+from model.clone_cache import CloneCache
+from model.clone_pool import ClonePool
+from model.git_miner import head_sha, is_ancestor, iter_commits
+
+
+def test_clone_is_deepened_to_previous_head(origin, commit_number, tmp_path):
+    cache = CloneCache(str(tmp_path / 'clones'))
+    url = f'file://{origin}'
+    path = cache.checkout(url, 2)
+    # nothing is checked out, mining reads blobs from the object database only
+    assert os.listdir(path) == ['.git']
+    since = head_sha(path)
+    for number in range(20, 27):
+        commit_number(origin, number)
+
+    # the fetch re-shallows the clone: the old HEAD is still in the object database, but not reachable
+    path = cache.checkout(url, 2)
+    assert not is_ancestor(path, since)
+
+    path = cache.checkout(url, 2, since)
+    assert is_ancestor(path, since)
+    mined = [commit.author_email for commit in iter_commits(path, 10, f'{since}..HEAD')]
+    assert mined == [f'author{number}@example.com' for number in range(26, 19, -1)]
+
+
+def test_pool_retries_failed_clones_and_refetches():
+    class FlakyCache:
+        checkouts = 0
+
+        def checkout(self, url, depth, since):
+            self.checkouts += 1
+            if self.checkouts == 1:
+                raise RuntimeError('network is down')
+            return '/clones/' + url
+
+    async def clone_twice(pool):
+        try:
+            await pool.clone('repo')
+        except RuntimeError:
+            pass
+        return await pool.clone('repo'), await pool.clone('repo')
+
+    cache = FlakyCache()
+    assert asyncio.run(clone_twice(ClonePool(cache=cache, keep_clones=False))) == ('/clones/repo', '/clones/repo')
+    assert cache.checkouts == 3
+
+    cache = FlakyCache()
+    asyncio.run(clone_twice(ClonePool(cache=cache)))
+    assert cache.checkouts == 2
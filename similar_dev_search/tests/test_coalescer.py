@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from model.coalescer import Coalescer
+
+
+def test_concurrent_calls_share_one_computation():
+    coalescer = Coalescer(keep_results=False)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return object()
+
+    async def main():
+        results = await asyncio.gather(*[coalescer.run('key', compute) for _ in range(5)])
+        assert len(coalescer) == 0
+        return results
+
+    results = asyncio.run(main())
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_concurrent_calls_share_one_exception_and_retry():
+    coalescer = Coalescer()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise RuntimeError('clone failed')
+        return 'cloned'
+
+    async def main():
+        results = await asyncio.gather(*[coalescer.run('key', compute) for _ in range(5)], return_exceptions=True)
+        assert 'key' not in coalescer
+        return results, await coalescer.run('key', compute), await coalescer.run('key', compute)
+
+    errors, retried, kept = asyncio.run(main())
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert all(error is errors[0] for error in errors)
+    assert retried == kept == 'cloned'
+    assert calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    coalescer = Coalescer()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return 'done'
+
+    async def main():
+        first = asyncio.ensure_future(coalescer.run('key', compute))
+        second = asyncio.ensure_future(coalescer.run('key', compute))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'done'
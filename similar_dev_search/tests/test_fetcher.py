@@ -0,0 +1,30 @@
+import asyncio
+
+import httpx
+
+import model.fetcher as fetcher
+from model import constants
+from model.github_session import GitHubSession
+from model.http_cache import ResponseCache
+
+SEED = 'https://github.com/owner/seed'
+
+
+def test_failed_pages_are_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, 'STARGAZER_PAGES_NUM', 10)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params['page'])
+        if page == 2:
+            return httpx.Response(404)
+        links = '<https://api.github.com/repos/owner/seed/stargazers?page=3&per_page=100>; rel="last"'
+        return httpx.Response(200, json=[{'login': f'user{page}'}], headers={'link': links})
+
+    async def stargazers(failures):
+        async with GitHubSession(['token'], transport=httpx.MockTransport(handler),
+                                 cache=ResponseCache(str(tmp_path / 'http_cache.sqlite'), ttl=0)) as session:
+            return [url async for page in fetcher.iter_stargazers(SEED, session, failures) for url in page]
+
+    failures = []
+    assert sorted(asyncio.run(stargazers(failures))) == ['https://github.com/user1', 'https://github.com/user3']
+    assert failures == ['https://api.github.com/repos/owner/seed/stargazers?page=2&per_page=100']
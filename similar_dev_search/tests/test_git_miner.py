@@ -0,0 +1,49 @@
+import subprocess
+
+from model.git_miner import BlobReader, iter_commits, shallow_commits
+
+
+def _clone(origin, tmp_path, depth):
+    path = tmp_path / f'clone{depth}'
+    subprocess.run(['git', 'clone', '-q', f'--depth={depth}', f'file://{origin}', str(path)],
+                   check=True, capture_output=True)
+    return str(path)
+
+
+def test_shallow_boundary_is_not_mined(origin, tmp_path):
+    clone = _clone(origin, tmp_path, 3)
+    assert len(shallow_commits(clone)) == 1
+
+    commits = list(iter_commits(clone, 3, with_hunks=True))
+
+    # the boundary commit would be diffed against the empty tree and credited with all 18 files
+    assert [commit.author_email for commit in commits] == ['author19@example.com', 'author18@example.com']
+    assert [[file.path for file in commit.files] for commit in commits] == [['file19.py'], ['file18.py']]
+
+
+def test_limit_counts_mined_commits(origin, tmp_path):
+    clone = _clone(origin, tmp_path, 4)
+
+    commits = list(iter_commits(clone, 3))
+
+    assert [commit.author_email for commit in commits] == [f'author{number}@example.com' for number in (19, 18, 17)]
+    assert all(len(commit.files) == 1 for commit in commits)
+
+
+def test_full_clone_has_no_boundary(origin):
+    commits = list(iter_commits(str(origin)))
+
+    assert shallow_commits(str(origin)) == set()
+    assert len(commits) == 20
+    assert commits[-1].files[0].is_added
+
+
+def test_blob_prefix_is_read(origin, git, commit):
+    commit(origin, {'large.txt': b'a' * 200000})
+    blobs = git(origin, 'rev-parse', 'HEAD:large.txt', 'HEAD:file0.py').split()
+
+    with BlobReader(str(origin)) as blob_reader:
+        assert blob_reader.read(blobs[0], 10) == b'a' * 10
+        # the rest of the skipped blob does not leak into the next read
+        assert blob_reader.read(blobs[1]) == b'value_0 = 0\n'
+        assert len(blob_reader.read(blobs[0])) == 200000
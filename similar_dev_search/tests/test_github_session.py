@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import httpx
+
+from model import constants
+from model.github_session import GitHubSession
+from model.http_cache import ResponseCache
+
+URL = 'https://api.github.com/repos/owner/seed/stargazers?page=1&per_page=100'
+
+
+def test_fresh_cache_hit_needs_no_token_budget(tmp_path):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=[{'login': 'user'}],
+                              headers={'x-ratelimit-remaining': '0', 'x-ratelimit-reset': str(time.time() + 3600)})
+
+    cache = ResponseCache(str(tmp_path / 'http_cache.sqlite'), ttl=60)
+
+    async def get(token: str) -> httpx.Response:
+        async with GitHubSession([token], transport=httpx.MockTransport(handler), cache=cache) as session:
+            first = await session.get(URL)
+            # the budget of the token is spent, a request would wait for the reset
+            second = await asyncio.wait_for(session.get(URL), timeout=5)
+            assert first.json() == second.json()
+            return second
+
+    asyncio.run(get('first'))
+    # another token reuses the entries of the first one
+    asyncio.run(get('second'))
+    assert len(requests) == 1
+
+
+def test_secondary_rate_limit_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, 'SECONDARY_RATE_LIMIT_BACKOFF_SECONDS', 0.5)
+    answers = [httpx.Response(403, json={'message': 'You have exceeded a secondary rate limit.'}),
+               httpx.Response(200, json=[{'login': 'user'}])]
+    sent_at = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent_at.append(time.monotonic())
+        return answers.pop(0)
+
+    async def get() -> httpx.Response:
+        async with GitHubSession(['token'], transport=httpx.MockTransport(handler),
+                                 cache=ResponseCache(str(tmp_path / 'http_cache.sqlite'), ttl=0)) as session:
+            return await session.get(URL)
+
+    assert asyncio.run(get()).json() == [{'login': 'user'}]
+    assert sent_at[1] - sent_at[0] >= 0.5
@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+import pytest
+
+import model.fetcher  # noqa: F401, imported first to resolve the fetcher <-> repository import cycle
+from model import constants, graphql_fetcher
+from model.github_session import GitHubSession
+from model.http_cache import ResponseCache
+
+RATE_LIMITED = {'data': None, 'errors': [{'type': 'RATE_LIMITED', 'message': 'API rate limit exceeded'}]}
+
+
+STARGAZERS = {'data': {'q0': {'stargazers': {'pageInfo': {'hasNextPage': False, 'endCursor': None},
+                                             'nodes': [{'login': 'user'}]}}}}
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(constants, 'RETRY_BACKOFF_SECONDS', 0.01)
+
+
+def _fetch(tmp_path, answers, failures):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=answers.pop(0) if answers else STARGAZERS)
+
+    async def fetch():
+        async with GitHubSession(['token'], max_retries=2, transport=httpx.MockTransport(handler),
+                                 cache=ResponseCache(str(tmp_path / 'http_cache.sqlite'))) as session:
+            return await graphql_fetcher.fetch_stargazers('https://github.com/owner/seed', session, 1, failures)
+
+    return asyncio.run(fetch())
+
+
+def test_rate_limited_query_is_retried(tmp_path):
+    failures = []
+    assert _fetch(tmp_path, [RATE_LIMITED], failures) == ['https://github.com/user']
+    assert failures == []
+
+
+def test_failed_query_is_reported(tmp_path):
+    failures = []
+    assert _fetch(tmp_path, [RATE_LIMITED] * 3, failures) == []
+    assert failures == ['https://github.com/owner/seed']
+
+
+def test_missing_repository_is_not_a_failure(tmp_path):
+    not_found = {'data': {'q0': None}, 'errors': [{'type': 'NOT_FOUND', 'path': ['q0'], 'message': 'Not found'}]}
+    failures = []
+    assert _fetch(tmp_path, [not_found], failures) == []
+    assert failures == []
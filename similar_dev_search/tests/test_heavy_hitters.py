@@ -0,0 +1,42 @@
+import random
+from collections import Counter
+
+from model.heavy_hitters import SpaceSaving
+
+
+def _stream(length, distinct, seed=0):
+    # Zipf-like: a few repositories are starred by most stargazers, most of them by a few
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices([f'repo{rank}' for rank in range(distinct)], weights, k=length)
+
+
+def test_counts_are_exact_below_capacity():
+    stream = _stream(5000, 100)
+    heavy_hitters = SpaceSaving(capacity=100)
+    for item in stream:
+        heavy_hitters.add(item)
+
+    exact = Counter(stream)
+    assert dict(heavy_hitters.counts) == dict(exact)
+    assert set(heavy_hitters.errors.values()) == {0}
+    assert [count for _, count in heavy_hitters.most_common(10)] == [count for _, count in exact.most_common(10)]
+
+
+def test_approximate_counts_are_within_error_bound():
+    stream = _stream(20000, 2000)
+    capacity = 50
+    heavy_hitters = SpaceSaving(capacity=capacity)
+    for item in stream:
+        heavy_hitters.add(item)
+
+    exact = Counter(stream)
+    bound = len(stream) / capacity
+    assert len(heavy_hitters) == capacity
+    for item, count in heavy_hitters.counts.items():
+        assert exact[item] <= count <= exact[item] + heavy_hitters.errors[item]
+        assert heavy_hitters.errors[item] <= bound
+    # every item seen more than n / capacity times is monitored
+    assert {item for item, count in exact.items() if count > bound} <= set(heavy_hitters.counts)
+    # the most frequent items are far above the bound, so their ranking is exact
+    assert [item for item, _ in heavy_hitters.most_common(3)] == [item for item, _ in exact.most_common(3)]
@@ -0,0 +1,37 @@
+import sqlite3
+
+import httpx
+
+from model.http_cache import ResponseCache
+
+
+def _response(body: bytes) -> httpx.Response:
+    return httpx.Response(200, headers={'etag': '"v1"'}, content=body, request=httpx.Request('GET', 'https://x'))
+
+
+def test_hit_does_not_lock_database(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(path, ttl=60)
+    cache.put('key', 'https://x', _response(b'body'))
+
+    assert cache.get('key').body == b'body'
+
+    # another process writes while this one keeps serving hits
+    other = sqlite3.connect(path, timeout=0)
+    with other:
+        other.execute("UPDATE responses SET fetched_at = 0 WHERE key = 'key'")
+    other.close()
+    cache.close()
+
+
+def test_access_times_are_written_on_flush(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(path, ttl=60)
+    cache.put('key', 'https://x', _response(b'body'))
+    accessed_before = sqlite3.connect(path).execute('SELECT accessed_at FROM responses').fetchone()[0]
+
+    cache.get('key')
+    cache.flush()
+
+    assert sqlite3.connect(path).execute('SELECT accessed_at FROM responses').fetchone()[0] > accessed_before
+    cache.close()
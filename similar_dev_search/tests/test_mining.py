@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from model import mining
+from model.mining import mine_repository
+
+
+@pytest.mark.parametrize('blob_cache', [None, 'cache'])
+def test_same_blob_at_different_paths(repo, commit, tmp_path, blob_cache):
+    commit(repo, {'pkg/__init__.py': '', 'notes.md': '', 'data.json': ''}, 'a@example.com')
+    blob_cache_path = str(tmp_path / 'blobs.sqlite') if blob_cache else None
+
+    for _ in range(2):
+        result = mine_repository('repo', str(repo), 10, blob_cache_path=blob_cache_path)
+
+        assert result.error is None
+        languages, _ = result.developers['a@example.com']
+        assert languages == {'Python': 1, 'Markdown': 1, 'JSON': 1}
+
+
+def test_identifiers_are_extracted_per_language(repo, commit, tmp_path):
+    commit(repo, {'first.py': 'first_value = 1\n', 'second.md': 'first_value = 1\n'}, 'a@example.com')
+    blob_cache_path = str(tmp_path / 'blobs.sqlite')
+
+    for _ in range(2):
+        result = mine_repository('repo', str(repo), 10, blob_cache_path=blob_cache_path)
+
+        languages, variables = result.developers['a@example.com']
+        assert languages == {'Python': 1, 'Markdown': 1}
+        assert 'first_value' in variables
+
+
+@pytest.mark.parametrize('blob_cache', [None, 'cache'])
+def test_generated_and_binary_files_are_skipped(repo, commit, tmp_path, blob_cache):
+    commit(repo, {'api_pb2.py': 'generated_value = 1\n', 'lib.min.js': 'var minified_value;\n',
+                  'package-lock.json': '{}', 'blob.py': 'binary_value = 1\n\x00', 'main.py': 'source_value = 1\n'},
+           'a@example.com')
+    blob_cache_path = str(tmp_path / 'blobs.sqlite') if blob_cache else None
+
+    for _ in range(2):
+        result = mine_repository('repo', str(repo), 10, blob_cache_path=blob_cache_path)
+
+        languages, variables = result.developers['a@example.com']
+        assert languages == {'Python': 1}
+        assert 'source_value' in variables
+        assert not {'generated_value', 'minified_value', 'binary_value'} & set(variables)
+
+
+def test_extraction_stops_at_timeout(repo, commit, monkeypatch):
+    commit(repo, {f'file{number}.py': f'value_{number} = 1\n' for number in range(10)}, 'a@example.com')
+    extract = mining.get_language_variables
+
+    def slow_extract(*args):
+        time.sleep(0.1)
+        return extract(*args)
+
+    monkeypatch.setattr(mining, 'get_language_variables', slow_extract)
+    start = time.monotonic()
+    result = mining.mine_repository('repo', str(repo), 10, timeout=0.25, blob_cache_path=None)
+
+    assert time.monotonic() - start < 0.6
+    assert result.error.startswith('timed out after extracting')
+    assert result.developers['a@example.com'][0] == {'Python': 10}
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from model.metrics import metrics
+from model.pipeline import Pipeline, Stage
+
+
+def test_full_queue_blocks_the_emitting_stage():
+    in_flight = []
+    emitted = consumed = 0
+
+    async def produce(item, emit):
+        nonlocal emitted
+        for number in range(10):
+            await emit((item, number))
+            emitted += 1
+
+    async def consume(item, emit):
+        nonlocal consumed
+        in_flight.append(emitted - consumed)
+        await asyncio.sleep(0.001)
+        consumed += 1
+
+    asyncio.run(Pipeline([Stage('produce', produce, queue_size=2),
+                          Stage('consume', consume, concurrency=2, queue_size=3)]).run(range(10)))
+
+    assert consumed == 100
+    # the producer runs ahead of the consumers by at most the queue and the items being consumed
+    assert max(in_flight) <= 3 + 1 + 2
+
+
+def test_failed_item_does_not_stop_the_stage(capsys):
+    results = []
+
+    async def parse(item, emit):
+        await emit(10 // item)
+
+    async def collect(item, emit):
+        results.append(item)
+
+    errors_before = metrics.counter('pipeline_stage_errors', stage='parse')
+    asyncio.run(Pipeline([Stage('parse', parse, concurrency=3), Stage('collect', collect)]).run([5, 0, 2, 1]))
+
+    assert sorted(results) == [2, 5, 10]
+    assert metrics.counter('pipeline_stage_errors', stage='parse') == errors_before + 1
+    assert 'Something went wrong in stage parse with 0' in capsys.readouterr().out
+
+
+def test_finish_emits_after_the_last_item():
+    results = []
+    seen = []
+
+    async def count(item, emit):
+        seen.append(item)
+
+    async def emit_total(emit):
+        await emit(len(seen))
+
+    async def collect(item, emit):
+        results.append(item)
+
+    asyncio.run(Pipeline([Stage('count', count, concurrency=4, finish=emit_total),
+                          Stage('collect', collect)]).run(range(25)))
+
+    # finish runs once, after every worker of the stage is done
+    assert results == [25]
+
+
+def test_failed_finish_stops_the_pipeline():
+    async def handle(item, emit):
+        await emit(item)
+
+    async def fail(emit):
+        raise RuntimeError('finish failed')
+
+    async def collect(item, emit):
+        pass
+
+    with pytest.raises(RuntimeError, match='finish failed'):
+        asyncio.run(asyncio.wait_for(Pipeline([Stage('aggregate', handle, finish=fail),
+                                               Stage('collect', collect)]).run(range(5)), timeout=5))
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+
+import model.fetcher  # noqa: F401, imported first to resolve the fetcher <-> repository import cycle
+from model import constants
+from model.checkpoint import Checkpoint
+from model.clone_pool import default_pool
+from model.github_session import GitHubSession
+from model.http_cache import ResponseCache
+from model.repository import Repository
+from model.repository_aggregator import RepositoryAggregator
+
+SEED = 'https://github.com/owner/seed'
+STARGAZERS = [f'user{number}' for number in range(20)]
+
+
+class Interrupted(BaseException):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def no_clones(monkeypatch):
+    async def clone(url, since=None):
+        raise RuntimeError('no clones in this test')
+
+    monkeypatch.setattr(default_pool, 'clone', clone)
+    monkeypatch.setattr(constants, 'STARGAZERS_CONCURRENCY', 1)
+    # emitting stargazers waits for the starred repositories stage, as with a full queue of a real crawl
+    monkeypatch.setattr(constants, 'PIPELINE_QUEUE_SIZE', 1)
+
+
+def _run(tmp_path, requests, resume, interrupt_at=None):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path.endswith('/stargazers'):
+            return httpx.Response(200, json=[{'login': login} for login in STARGAZERS])
+        login = request.url.path.split('/')[2]
+        if login == interrupt_at:
+            raise Interrupted()
+        return httpx.Response(200, json=[{'html_url': 'https://github.com/owner/popular'},
+                                         {'html_url': f'https://github.com/{login}/own'}])
+
+    async def run(aggregator):
+        async with GitHubSession(['token'], transport=httpx.MockTransport(handler),
+                                 cache=ResponseCache(str(tmp_path / 'http_cache.sqlite'), ttl=0)) as session:
+            await aggregator.get_developers(session)
+
+    with Checkpoint(str(tmp_path / 'checkpoint.sqlite'), interval=0) as checkpoint:
+        aggregator = RepositoryAggregator(Repository(SEED), checkpoint=checkpoint, resume=resume)
+        try:
+            asyncio.run(run(aggregator))
+        except Interrupted:
+            return None
+    return aggregator
+
+
+def test_resume_after_interrupted_crawl(tmp_path):
+    requests = []
+    assert _run(tmp_path, requests, resume=False, interrupt_at='user3') is None
+    assert '/users/user0/starred' in requests
+
+    requests = []
+    aggregator = _run(tmp_path, requests, resume=True)
+
+    starred_requests = [path for path in requests if path.endswith('/starred')]
+    assert sorted(starred_requests) == sorted(f'/users/user{number}/starred' for number in range(3, 20))
+    assert aggregator.top_repos.most_common(1) == [('https://github.com/owner/popular', 20)]
+
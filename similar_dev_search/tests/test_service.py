@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+import pytest
+
+import model.fetcher  # noqa: F401, imported first to resolve the fetcher <-> repository import cycle
+from model.developer import Developer
+from model.developer_entry import DeveloperEntry
+from model.feature_store import FeatureStore
+from model.github_session import GitHubSession
+from model.http_cache import ResponseCache
+from model.service import QueryService
+
+
+@pytest.mark.parametrize('k', ['0', '-1', 'many'])
+def test_invalid_k_is_rejected(tmp_path, k):
+    service = QueryService(FeatureStore(str(tmp_path / 'features.sqlite')))
+    service.load()
+
+    status, answer = asyncio.run(service.answer('GET', f'/similar?developer=a@example.com&k={k}'))
+
+    assert status == 400
+    assert 'k must be' in answer['error']
+
+
+def test_failed_refresh_is_retried_after_backoff(tmp_path, monkeypatch):
+    service = QueryService(FeatureStore(str(tmp_path / 'features.sqlite')))
+    service.load()
+    url = 'https://github.com/owner/repo'
+    outcomes = [RuntimeError('API answered 500'), Developer(url)]
+
+    async def refresh_repository(_):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(service, '_refresh_repository', refresh_repository)
+
+    async def query():
+        status, _ = await service.similar('repo', url, 5)
+        await asyncio.gather(*service._background)
+        return status
+
+    async def queries():
+        assert await query() == 202
+        assert await query() == 503
+        service.failures['repo:' + url] = service.failures['repo:' + url]._replace(failed_at=0.0)
+        assert await query() == 202
+        assert await query() == 200
+
+    asyncio.run(queries())
+    assert service.failures == {}
+
+
+def test_login_profile_has_only_its_own_commits(tmp_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/users/login/repos':
+            return httpx.Response(200, json=[{'html_url': 'https://github.com/login/repo', 'fork': False}])
+        assert request.url.params['author'] == 'login'
+        return httpx.Response(200, json=[{'commit': {'author': {'email': 'Login@example.com'}}}])
+
+    async def mine_repository(url):
+        return {'login@example.com': DeveloperEntry.from_dicts({'Python': 1}, {'own_name': 1}),
+                '1+login@users.noreply.github.com': DeveloperEntry.from_dicts({'Python': 1}, {'noreply_name': 1}),
+                'other@example.com': DeveloperEntry.from_dicts({'Go': 1}, {'other_name': 1})}
+
+    async def refresh():
+        async with GitHubSession(['token'], transport=httpx.MockTransport(handler),
+                                 cache=ResponseCache(str(tmp_path / 'http_cache.sqlite'))) as session:
+            service = QueryService(FeatureStore(str(tmp_path / 'features.sqlite')), session)
+            service._mine_repository = mine_repository
+            return await service._refresh_login('login')
+
+    profile = asyncio.run(refresh())
+
+    assert profile.languages == {'Python': 2}
+    assert profile.variables == {'own_name': 1, 'noreply_name': 1}
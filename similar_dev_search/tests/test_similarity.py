@@ -0,0 +1,84 @@
+import math
+import random
+
+import pytest
+
+import model.fetcher  # noqa: F401, imported first to resolve the fetcher <-> repository import cycle
+from model.developer import Developer
+from model.similarity import SimilarityEngine
+
+LANGUAGES_WEIGHT = 0.3
+
+
+def _developers(number, seed=0):
+    rng = random.Random(seed)
+    developers = []
+    for index in range(number):
+        developer = Developer(f'developer{index}@example.com')
+        developer.languages = {language: rng.randint(1, 20)
+                               for language in rng.sample(['Python', 'Go', 'Rust', 'Java', 'C'], rng.randint(1, 3))}
+        developer.variables = {f'similarity_name_{name}': rng.randint(1, 5)
+                               for name in rng.sample(range(40), rng.randint(0, 10))}
+        developers.append(developer)
+    return developers
+
+
+def _tf_idf(profiles):
+    frequency = dict()
+    for profile in profiles:
+        for feature in profile:
+            frequency[feature] = frequency.get(feature, 0) + 1
+    vectors = []
+    for profile in profiles:
+        vector = {feature: math.log1p(count) * (math.log((1 + len(profiles)) / (1 + frequency[feature])) + 1)
+                  for feature, count in profile.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1
+        vectors.append({feature: value / norm for feature, value in vector.items()})
+    return vectors
+
+
+def _brute_force(developers):
+    languages = _tf_idf([developer.languages for developer in developers])
+    variables = _tf_idf([developer.variables for developer in developers])
+
+    def cosine(first, second):
+        return sum(value * second.get(feature, 0) for feature, value in first.items())
+
+    def score(i, j):
+        return LANGUAGES_WEIGHT * cosine(languages[i], languages[j]) + \
+            (1 - LANGUAGES_WEIGHT) * cosine(variables[i], variables[j])
+
+    return [[score(i, j) for j in range(len(developers))] for i in range(len(developers))]
+
+
+def _assert_ranking(ranking, developers, scores, exclude, k):
+    expected = sorted((score for j, score in enumerate(scores) if j != exclude), reverse=True)[:k]
+    assert [similarity for _, similarity in ranking] == pytest.approx(expected, abs=1e-5)
+    for developer, similarity in ranking:
+        assert similarity == pytest.approx(scores[developers.index(developer)], abs=1e-5)
+
+
+def test_top_k_matches_brute_force():
+    developers = _developers(60)
+    engine = SimilarityEngine(developers, LANGUAGES_WEIGHT)
+    reference = _brute_force(developers)
+
+    for i in (0, 17, 59):
+        ranking = engine.top_k(developers[i], 7)
+
+        assert developers[i] not in [developer for developer, _ in ranking]
+        _assert_ranking(ranking, developers, reference[i], i, 7)
+
+
+def test_all_pairs_top_k_matches_brute_force(monkeypatch):
+    developers = _developers(60)
+    # several chunks, the last one partial
+    monkeypatch.setattr('model.similarity.PAIRS_CHUNK_SIZE', 16)
+    engine = SimilarityEngine(developers, LANGUAGES_WEIGHT)
+    reference = _brute_force(developers)
+
+    pairs = list(engine.all_pairs_top_k(5))
+
+    assert [developer for developer, _ in pairs] == developers
+    for i, (developer, ranking) in enumerate(pairs):
+        _assert_ranking(ranking, developers, reference[i], i, 5)